@@ -1,32 +1,93 @@
-from flask import Flask, request, jsonify, Response
+import time
+
+# 콜드 스타트 비용 측정용 (app 모듈 import 시작 시각)
+_import_started = time.perf_counter()
+
+from flask import Flask, request, jsonify, Response, g
 from dotenv import load_dotenv
+import importlib
 import os
-import re
-import threading
-import queue
+import json
+import logging
+import uuid
 
 from flask_cors import CORS
-from langchain_openai import ChatOpenAI
-from langchain.memory import ConversationSummaryBufferMemory
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
-from langchain.schema.runnable import RunnablePassthrough
-from langchain.callbacks.base import BaseCallbackHandler
-
-from news_summary import summarize_news
-from ocr import ocr_with_clova
-from parse import parse_ocr_data
-from query_generator import generate_sql_query, execute_and_convert_to_natural_language
-import openai
-from db import get_database_engine
-
-# .env 파일의 경로를 명시적으로 설정
+
+# .env 파일의 경로를 명시적으로 설정 (각 모듈이 import 시점에 설정값을 읽으므로 가장 먼저 로드)
 dotenv_path = os.path.join(os.path.dirname(__file__), 'env/.env')
 load_dotenv(dotenv_path=dotenv_path)
 
+# langchain/openai/bs4/cv2/SQLAlchemy 를 쓰는 모듈은 각 엔드포인트에서 처음 쓸 때 import 합니다
+from expense_templates import match_expense_template
+from intent_router import route_input
+from metrics import timed, start_request_timings, record_request, render_metrics, set_gauge
+
+# 무거운 모듈 목록 (warm_up_imports 에서 미리 import)
+LAZY_MODULES = (
+    "chat_stream", "conversation_memory", "news_summary", "receipt_cache", "receipt_pipeline",
+    "records", "rollups", "query_generator", "db", "schema_cache", "ledger_analytics",
+)
+
+def _to_bool(value) -> bool:
+    """JSON/폼 값의 true/false 를 해석합니다 (문자열 "false", "0" 은 False)."""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+def _env_flag(name, default='true'):
+    return _to_bool(os.getenv(name, default))
+
+# /execute-sql/ 에서 SQL 결과가 준비되면 답변 토큰보다 먼저 보낼 진행 메시지 (요청의 progress 로도 지정 가능)
+EXECUTE_SQL_PROGRESS = _env_flag('EXECUTE_SQL_PROGRESS', 'false')
+EXECUTE_SQL_PROGRESS_MESSAGE = "조회가 끝났어! 정리해서 알려줄게.\n"
+
 app = Flask(__name__)
 CORS(app)
 
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+request_logger = logging.getLogger("pennybuddy.request")
+
+@app.before_request
+def start_request():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_started = time.perf_counter()
+    g.stage_timings = start_request_timings()
+
+@app.after_request
+def log_request(response):
+    """요청 ID 헤더를 붙이고, 응답 본문까지 모두 보낸 뒤 단계별 시간이 담긴 구조화 로그를 한 줄 남깁니다.
+
+    스트리밍 응답은 본문 생성 중에 단계 시간이 쌓이므로 call_on_close 에서 기록합니다.
+    duration_ms 는 응답 완료까지, response_start_ms 는 응답 시작까지의 시간입니다.
+    """
+    started = getattr(g, 'request_started', None)
+    if started is None or request.path == '/metrics':
+        return response
+    response_start = time.perf_counter() - started
+    endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+    response.headers['X-Request-ID'] = g.request_id
+    # 응답이 닫힐 때는 요청 컨텍스트가 없으므로 필요한 값을 미리 꺼내 둡니다
+    entry = {
+        "request_id": g.request_id,
+        "method": request.method,
+        "path": request.path,
+        "status": response.status_code,
+    }
+    stage_timings = g.stage_timings
+
+    def emit():
+        elapsed = time.perf_counter() - started
+        record_request(endpoint, entry["status"], elapsed)
+        request_logger.info(json.dumps({
+            **entry,
+            "duration_ms": round(elapsed * 1000, 2),
+            "response_start_ms": round(response_start * 1000, 2),
+            "stages_ms": stage_timings.copy(),
+        }, ensure_ascii=False))
+
+    response.call_on_close(emit)
+    return response
+
 def load_environment_variables():
     required_vars = ['DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT', 'DB_NAME', 'OPENAI_API_KEY', 'CLOVA_API_KEY',
                      'CLOVA_ENDPOINT', 'LANGCHAIN_ENDPOINT']
@@ -36,76 +97,66 @@ def load_environment_variables():
 
 load_environment_variables()
 
-# LangChain 챗봇 설정
-openai_api_key = os.getenv('OPENAI_API_KEY')
-llm = ChatOpenAI(api_key=openai_api_key, temperature=0.1)
-memory = ConversationSummaryBufferMemory(
-    llm=llm,
-    max_token_limit=80,
-    memory_key="chat_history",
-    return_messages=True,
-)
-
-def load_memory():
-    return memory.load_memory_variables({})["chat_history"]
-
-prompt = ChatPromptTemplate.from_messages([
-    ("system", "너는 사람과 대화하는 친절한 가계부 AI 키키 야.   "),
-    MessagesPlaceholder(variable_name="chat_history"),
-    ("human", "{question}"),
-])
-
-get_chat_history_func = lambda: load_memory()
-
-chain = RunnablePassthrough.assign(chat_history=get_chat_history_func) | prompt | llm
-
-class ThreadedGenerator:
-    def __init__(self):
-        self.queue = queue.Queue()
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        item = self.queue.get()
-        if item is StopIteration:
-            raise item
-        return item
+def warm_up_imports():
+    """무거운 모듈을 import 하고 공유 클라이언트를 만들어 둡니다.
+
+    네트워크/DB 연결을 열어 두지 않으므로 fork 전(gunicorn --preload)에 호출해도 안전하며, 워커들이 import 된 페이지를 공유합니다.
+    (LLM 응답 캐시는 테이블만 만들고 연결을 닫으며, 워커는 각자 자기 프로세스의 SQLite 연결을 엽니다.)
+    """
+    with timed("warm_up_imports"):
+        for module_name in LAZY_MODULES:
+            importlib.import_module(module_name)
+        from chat_stream import get_chat_model
+        from news_summary import get_llm
+        get_chat_model()
+        get_llm()
+
+def warm_up_connections():
+    """DB 커넥션 풀, 스키마 캐시, 월별 집계, 뉴스 요약 갱신을 준비합니다.
+
+    import 만으로는 호출되지 않으며, python app.py --warm-up 이나 gunicorn post_fork 훅에서 워커마다 명시적으로 호출합니다.
+    """
+    # 공유 커넥션 풀 미리 열어두기 (DB_WARM_UP=false 로 끌 수 있음)
+    if _env_flag('DB_WARM_UP'):
+        from db import warm_up_pool
+        from schema_cache import refresh_schema
+
+        print(f"DB 커넥션 풀 워밍업: {warm_up_pool()}개")
+        try:
+            refresh_schema()
+        except Exception as e:
+            print(f"스키마 캐시 워밍업 중 오류 발생: {e}")
 
-    def send(self, data):
-        self.queue.put(data)
+    # 월별 집계 테이블 준비 (ROLLUPS_ENABLED=true 일 때만)
+    if _env_flag('ROLLUPS_ENABLED', 'false'):
+        import rollups
 
-    def close(self):
-        self.queue.put(StopIteration)
+        try:
+            if rollups.ensure_rollup_table():
+                print("월별 집계 테이블 생성 및 전체 집계 완료")
+        except Exception as e:
+            print(f"월별 집계 준비 중 오류 발생: {e}")
 
+    # 뉴스 요약 미리 채워두기 (NEWS_REFRESH_ENABLED=false 로 끌 수 있음, 워밍업을 하지 않으면 첫 요청 때 시작)
+    from news_summary import NEWS_REFRESH_ENABLED, start_news_refresher
 
-class ChainStreamHandler(BaseCallbackHandler):
-    def __init__(self, gen):
-        self.gen = gen
+    if NEWS_REFRESH_ENABLED:
+        start_news_refresher()
 
-    def on_llm_new_token(self, token: str, **kwargs):
-        self.gen.send(token)
+# APP_PRELOAD=true 이면 import 시점에 무거운 모듈까지 미리 불러옵니다 (gunicorn --preload 용)
+if _env_flag('APP_PRELOAD', 'false'):
+    warm_up_imports()
 
-def llm_thread(g, prompt):
-    try:
-        chat = ChatOpenAI(
-            api_key=openai_api_key,
-            verbose=True,
-            streaming=True,
-            callbacks=[ChainStreamHandler(g)],
-            temperature=0.7,
-        )
-        chat([HumanMessage(content=prompt)])
-    finally:
-        g.close()
-
-def chain_stream(prompt):
-    g = ThreadedGenerator()
-    threading.Thread(target=llm_thread, args=(g, prompt)).start()
-    return g
+# import 만으로 연결을 열거나 백그라운드 스레드를 띄우지 않도록 기본은 꺼져 있습니다
+# (python app.py --warm-up 또는 gunicorn post_fork 훅에서 warm_up_connections() 를 호출하세요)
+if _env_flag('APP_WARM_UP_ON_IMPORT', 'false'):
+    warm_up_connections()
 
 @app.route('/chatbot/', methods=['POST'])
 def chatbot():
+    from chat_stream import chain_stream
+    from conversation_memory import memory_store
+
     print('chatbot 실행됨')
     data = request.json
     user_input = data.get('question', '')
@@ -113,7 +164,22 @@ def chatbot():
     if not user_input:
         return jsonify({"error": "메시지가 제공되지 않았습니다."}), 400
 
-    return Response(chain_stream(user_input), mimetype='text/plain')
+    # 사용자(세션)별 대화 메모리 - 요약은 백그라운드에서 갱신되고, 여기서는 최신 요약을 바로 읽기만 합니다
+    # 식별자가 없는 요청은 다른 사용자와 대화가 섞이지 않도록 메모리 없이 응답합니다
+    memory_key = data.get('session_id') or data.get('member_Id')
+    history, save_turn = None, None
+    if memory_key:
+        memory_key = str(memory_key)
+        history = memory_store.load(memory_key)
+
+        def save_turn(answer):
+            memory_store.add_turn(memory_key, user_input, answer)
+
+    stream = chain_stream(user_input, history=history, on_complete=save_turn)
+    if stream is None:
+        return jsonify({"error": "요청이 많아 잠시 후 다시 시도해주세요."}), 429
+
+    return Response(stream, mimetype='text/plain')
 
 @app.route('/execute-sql/', methods=['POST'])
 def query_expenses():
@@ -124,13 +190,38 @@ def query_expenses():
     if not user_question:
         return jsonify({"error": "질문이 제공되지 않았습니다."}), 400
 
+    progress = _to_bool(data.get('progress', EXECUTE_SQL_PROGRESS))
+    member_id = data.get('member_Id')
+
+    from ledger_analytics import answer_template
+    from query_generator import generate_sql_query, run_sql_query, stream_natural_language
+    from sql_guard import UnsafeQueryError
+    import rollups
+
     def stream_sql_response():
         try:
-            generated_query = generate_sql_query(user_question)
-
-            engine = get_database_engine()
-            natural_language_response = execute_and_convert_to_natural_language(engine, generated_query)
-            yield f"{natural_language_response}"
+            # 자주 묻는 지출 질문은 LLM 없이 미리 검증된 템플릿 쿼리로 처리
+            # 템플릿은 member_Id 의 기록만 집계하므로, member_Id 가 없으면 LLM 이 생성한 SQL 로 답합니다
+            template_query = match_expense_template(user_question, member_id, use_rollups=rollups.ROLLUPS_ENABLED)
+            result_str = None
+            if template_query is not None:
+                if rollups.ROLLUPS_ENABLED:
+                    rollups.ensure_rollup_table()
+                sql_query, params, guard = template_query.sql, template_query.params, False
+                # 분석 엔진이 켜져 있으면 회원 장부를 메모리에서 집계해 DB 조회 없이 답합니다
+                result_str = answer_template(template_query, member_id)
+            else:
+                sql_query, params, guard = generate_sql_query(user_question), None, True
+
+            if result_str is None:
+                result_str = run_sql_query(sql_query, params, guard)
+            if progress:
+                yield EXECUTE_SQL_PROGRESS_MESSAGE
+            # 답변은 LLM 토큰이 도착하는 대로 내보냅니다
+            for chunk in stream_natural_language(sql_query, result_str, params):
+                yield chunk
+        except UnsafeQueryError as e:
+            yield f"이 질문은 처리할 수 없어요: {e}\n"
         except Exception as e:
             yield f"서버 오류 발생: {e}\n"
 
@@ -146,33 +237,60 @@ def parse_ocr():
     if file.filename == '':
         return jsonify({"error": "파일 이름이 없습니다."}), 400
 
-    try:
-        clova_secret_key = os.getenv('CLOVA_API_KEY')
-        clova_api_url = os.getenv('CLOVA_ENDPOINT')
-        OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-        LangChain_api_url = os.getenv('LANGCHAIN_ENDPOINT')
-
-        file_location = f"temp_{file.filename}"
-        file.save(file_location)
-
-        ocr_data = ocr_with_clova(file_location, clova_secret_key, clova_api_url)
-        print("OCR Data Extracted:", ocr_data)
-
-        result = parse_ocr_data(ocr_data, OPENAI_API_KEY, LangChain_api_url)
-        print("Parsed OCR Data:", result)
+    from receipt_pipeline import process_receipt
 
-        os.remove(file_location)
+    try:
+        result = process_receipt(file.read())
         print(result.dict);
         return jsonify(result.dict())
-    except FileNotFoundError:
-        return jsonify({"error": "파일을 찾을 수 없습니다."}), 500
     except Exception as e:
         print(f"서버 오류 발생: {e}")
         return jsonify({"error": f"서버 오류 발생: {e}"}), 500
 
+@app.route('/parse-ocr-batch/', methods=['POST'])
+def parse_ocr_batch():
+    """여러 영수증 파일을 병렬로 파싱하여, 끝나는 대로 한 줄씩 JSON(NDJSON)으로 반환"""
+    from receipt_pipeline import process_receipts, BATCH_MAX_FILES
+    from records import insert_records
+
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({"error": "파일이 업로드되지 않았습니다."}), 400
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({"error": f"한 번에 최대 {BATCH_MAX_FILES}개까지 업로드할 수 있습니다."}), 400
+
+    persist = request.form.get('persist', 'false').lower() in ('1', 'true', 'yes')
+    member_id = request.form.get('member_Id')
+    if persist:
+        if not member_id or not member_id.isdigit():
+            return jsonify({"error": "persist=true 이면 저장할 회원의 member_Id 가 필요합니다."}), 400
+        member_id = int(member_id)
+    # 응답 스트리밍 중에는 요청 컨텍스트가 없으므로 파일 내용을 미리 읽어둡니다
+    items = [(file.filename, file.read()) for file in files]
+
+    def stream_batch():
+        parsed = []
+        for index, filename, result, error in process_receipts(items):
+            if error is not None:
+                line = {"index": index, "filename": filename, "error": f"서버 오류 발생: {error}"}
+            else:
+                parsed.append(result)
+                line = {"index": index, "filename": filename, "result": result.dict()}
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+        if persist:
+            try:
+                yield json.dumps({"persisted": insert_records(parsed, member_id)}, ensure_ascii=False) + "\n"
+            except Exception as e:
+                yield json.dumps({"error": f"저장 중 오류 발생: {e}"}, ensure_ascii=False) + "\n"
+
+    return Response(stream_batch(), mimetype='application/x-ndjson')
+
 @app.route('/summarize-news/', methods=['GET'])
 def summarize_news_endpoint():
     """뉴스 기사 링크를 요약"""
+    from news_summary import summarize_news
+
     def stream_news_summary():
         try:
             response = summarize_news()
@@ -183,34 +301,103 @@ def summarize_news_endpoint():
 
     return Response(stream_news_summary(), mimetype='text/plain')
 
-openai.api_key = os.getenv('OPENAI_API_KEY')
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """단계별 지연 히스토그램과 토큰 사용량을 Prometheus 형식으로 반환"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/db-pool-stats/', methods=['GET'])
+def db_pool_stats():
+    """DB 커넥션 풀 사용 현황 반환"""
+    from db import get_pool_stats
+    return jsonify(get_pool_stats())
+
+@app.route('/receipt-cache-stats/', methods=['GET'])
+def receipt_cache_stats():
+    """영수증 캐시 적중/미스 통계 반환"""
+    from receipt_cache import receipt_cache
+    return jsonify(receipt_cache.get_stats())
+
+@app.route('/llm-cache-stats/', methods=['GET'])
+def llm_cache_stats():
+    """LLM 응답 캐시의 호출 지점별 적중률과 저장 크기 반환"""
+    from llm_cache import get_llm_cache_stats
+    return jsonify(get_llm_cache_stats())
+
+@app.route('/analytics-stats/', methods=['GET'])
+def analytics_stats():
+    """회원 장부 분석 캐시의 회원 수, 기록 수, 적중률 반환"""
+    from ledger_analytics import ledger_cache
+    return jsonify(ledger_cache.get_stats())
+
+@app.route('/rebuild-rollups/', methods=['POST'])
+def rebuild_rollups_endpoint():
+    """records 를 다시 집계해 월별 집계 테이블을 새로 채움 (member_Id 를 주면 해당 회원만)"""
+    import rollups
+
+    data = request.get_json(silent=True) or {}
+    try:
+        # 테이블이 없으면 만들면서 전체를 집계하므로, 그때는 다시 집계하지 않습니다
+        if not rollups.ensure_rollup_table():
+            rollups.rebuild_rollups(data.get('member_Id'))
+        return jsonify({"rebuilt": True})
+    except Exception as e:
+        return jsonify({"error": f"서버 오류 발생: {e}"}), 500
+
+@app.route('/period-totals/', methods=['POST'])
+def period_totals_endpoint():
+    """월별 집계 테이블에서 [start_date, end_date) 월 범위의 수입/지출 합계와 월/카테고리별 합계 반환"""
+    import rollups
+
+    data = request.get_json(silent=True) or {}
+    member_id, start_date, end_date = data.get('member_Id'), data.get('start_date'), data.get('end_date')
+    if not member_id or not start_date or not end_date:
+        return jsonify({"error": "member_Id, start_date, end_date 가 필요합니다."}), 400
+    if not rollups.ROLLUPS_ENABLED:
+        return jsonify({"error": "월별 집계가 꺼져 있습니다 (ROLLUPS_ENABLED)."}), 400
+
+    try:
+        months = rollups.get_monthly_totals(member_id, start_date, end_date)
+        return jsonify({
+            "totals": rollups.get_period_totals(member_id, start_date, end_date),
+            "months": [dict(row._mapping) for row in months],
+        })
+    except Exception as e:
+        return jsonify({"error": f"서버 오류 발생: {e}"}), 500
+
+@app.route('/delete-record/', methods=['POST'])
+def delete_record_endpoint():
+    """member_Id 회원의 기록을 삭제 표시하고 월별 집계와 장부 분석 캐시에서도 뺌"""
+    from records import soft_delete_record
+
+    data = request.get_json(silent=True) or {}
+    record_id, member_id = data.get('record_Id'), data.get('member_Id')
+    if not record_id or not member_id:
+        return jsonify({"error": "record_Id 와 member_Id 가 필요합니다."}), 400
+
+    try:
+        if not soft_delete_record(int(record_id), int(member_id)):
+            return jsonify({"error": "기록이 없거나 이미 삭제되었습니다."}), 404
+        return jsonify({"deleted": True})
+    except Exception as e:
+        return jsonify({"error": f"서버 오류 발생: {e}"}), 500
+
+@app.route('/refresh-schema/', methods=['POST'])
+def refresh_schema_endpoint():
+    """DB 스키마 변경 후 스키마 캐시를 즉시 갱신"""
+    from schema_cache import refresh_schema
+
+    try:
+        return jsonify({"version": refresh_schema()})
+    except Exception as e:
+        return jsonify({"error": f"서버 오류 발생: {e}"}), 500
 
 def analyze_input(user_input):
-    if "뉴스" in user_input:
-        return "summarize-news"
-    # elif "OCR" in user_input:
-    #     return "parse-ocr"
-    elif is_expense_query(user_input):
-        return "execute-sql"
-    else:
-        return "chatbot"
+    with timed("routing"):
+        return route_input(user_input).intent
 
 def is_expense_query(user_input):
-    expense_patterns = [
-        r"\d{4}\s*년\s*\d{1,2}\s*월\s*에\s*얼마\s*썼어",         # 2024년 7월에 얼마 썼어
-        r"\d{2}\s*년\s*\d{1,2}\s*월\s*에\s*얼마\s*썼어",          # 24년 7월에 얼마 썼어
-        r"\d{1,2}\s*월\s*에\s*얼마\s*썼어",                     # 7월에 얼마 썼어
-        r"올해\s*얼마나\s*많이\s*돈\s*을\s*썼(어|지)",           # 올해 얼마나 많이 돈을 썼어/썼지
-        r"여태까지\s*쓴\s*지출\s*내역\s*(알려줘)?",             # 여태까지 쓴 지출 내역 알려줘
-        r"지난\s*달\s*소비\s*내역\s*(알려줘)?",                 # 지난 달 소비 내역 알려줘
-        r"이번\s*달\s*지출\s*(알려줘)?",                       # 이번 달 지출 알려줘
-        r"최근\s*소비\s*기록\s*(알려줘)?",                      # 최근 소비 기록 알려줘
-        r"소비", r"얼마", r"지출", r"수입", r"수익", r"내역", r"자산",
-    ]
-    for pattern in expense_patterns:
-        if re.search(pattern, user_input):
-            return True
-    return False
+    return route_input(user_input).intent == "execute-sql"
 
 @app.route('/analyze-and-execute/', methods=['POST'])
 def analyze_and_execute():
@@ -234,5 +421,20 @@ def analyze_and_execute():
 
     return response
 
+# app 모듈 import 에 걸린 시간 (콜드 스타트 비용)
+APP_IMPORT_SECONDS = time.perf_counter() - _import_started
+set_gauge("app_import_seconds", APP_IMPORT_SECONDS, help_text="app 모듈 import 에 걸린 시간(초)")
+print(f"app import 시간: {APP_IMPORT_SECONDS:.3f}초")
+
 if __name__ == '__main__':
+    import argparse
+    from werkzeug.serving import is_running_from_reloader
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--warm-up', action='store_true',
+                        help='시작할 때 DB 커넥션 풀, 스키마 캐시, 월별 집계, 뉴스 요약 갱신을 미리 준비합니다')
+    args = parser.parse_args()
+    # debug 모드의 리로더 감시 프로세스가 아니라 실제로 요청을 받는 프로세스에서만 준비합니다
+    if args.warm_up and is_running_from_reloader():
+        warm_up_connections()
     app.run(debug=True)
\ No newline at end of file
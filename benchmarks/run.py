@@ -0,0 +1,206 @@
+"""로컬 가짜 서버를 상대로 Flask 앱에 부하를 걸고 엔드포인트별 처리량/지연 시간을 JSON 으로 출력합니다.
+
+사용법 (저장소 루트에서):
+    python -m benchmarks.run --requests 200 --concurrency 16 --output bench.json
+
+DB 는 DB_* 환경 변수로 지정한 로컬 MySQL 을 사용합니다 (기본값: 127.0.0.1:3306/testkb).
+부하를 걸기 전에 records / Category 테이블과 기록이 있는지 확인하며, 비어 있으면 --seed 로 함께 채우거나
+python -m benchmarks.seed 를 먼저 실행하세요.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+from benchmarks.seed import DEFAULT_MEMBERS, database_status, seed_database, set_default_environment
+from benchmarks.stubs import StubConfig, start_stub_server
+
+ENDPOINTS = ("chatbot", "execute-sql-template", "execute-sql-llm", "parse-ocr", "summarize-news", "analyze-and-execute")
+
+
+def _configure_environment(stub_url: str):
+    """앱이 가짜 서버를 보도록 환경 변수를 설정합니다 (앱 import 전에 호출)."""
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_API_BASE": f"{stub_url}/v1",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "CLOVA_API_KEY": "bench",
+        "CLOVA_ENDPOINT": f"{stub_url}/ocr",
+        "LANGCHAIN_ENDPOINT": stub_url,
+        "LANGCHAIN_TRACING_V2": "false",
+        "NEWS_SEARCH_URL": f"{stub_url}/search?query=kb",
+    })
+    set_default_environment()
+
+
+def _check_database(seed: bool, members: int):
+    """부하를 걸기 전에 벤치마크 DB 를 확인합니다. 비어 있으면 --seed 일 때만 채우고, 아니면 종료합니다."""
+    try:
+        status = database_status()
+        if seed and not (status["records_table"] and status["category_table"] and status["records"]):
+            print(f"benchmark: 기록 {seed_database(members=members)}건을 채웠습니다", file=sys.stderr)
+            status = database_status()
+    except Exception as e:
+        sys.exit(f"벤치마크 DB 에 연결할 수 없습니다 ({os.environ.get('DB_HOST')}:{os.environ.get('DB_PORT')}/"
+                 f"{os.environ.get('DB_NAME')}): {e}")
+    if not (status["records_table"] and status["category_table"] and status["records"]):
+        sys.exit("벤치마크 DB 에 records / Category 테이블이나 기록이 없습니다. "
+                 "python -m benchmarks.seed 를 먼저 실행하거나 --seed 를 붙이세요.")
+
+
+def _receipt_image(index: int) -> bytes:
+    """요청마다 다른 영수증 이미지를 만들어 영수증 캐시에 걸리지 않게 합니다."""
+    import cv2
+    import numpy as np
+
+    image = np.full((1200, 800, 3), 255, dtype=np.uint8)
+    cv2.putText(image, f"RECEIPT {index}", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 3)
+    image[200 + index % 800, :, :] = index % 256
+    ok, encoded = cv2.imencode(".png", image)
+    return encoded.tobytes()
+
+
+def _request_spec(endpoint: str, index: int, members: int = DEFAULT_MEMBERS):
+    """(메서드, 경로, requests 인자) 를 반환합니다. 가계부 질문은 시드한 회원들에 고르게 나눠 보냅니다."""
+    member_id = index % members + 1
+    if endpoint == "chatbot":
+        return "POST", "/chatbot/", {"json": {"question": "적금이 뭐야?", "session_id": f"bench-{index % 50}"}}
+    if endpoint == "execute-sql-template":
+        return "POST", "/execute-sql/", {"json": {"question": "이번 달 지출 알려줘", "member_Id": member_id}}
+    if endpoint == "execute-sql-llm":
+        return "POST", "/execute-sql/", {"json": {"question": "식비로 제일 많이 쓴 날이 언제야?", "member_Id": member_id}}
+    if endpoint == "parse-ocr":
+        return "POST", "/parse-ocr/", {"files": {"file": (f"receipt_{index}.png", _receipt_image(index))}}
+    if endpoint == "summarize-news":
+        return "GET", "/summarize-news/", {}
+    if endpoint == "analyze-and-execute":
+        return "POST", "/analyze-and-execute/", {"json": {"question": "오늘 기분 어때?"}}
+    raise ValueError(f"알 수 없는 엔드포인트: {endpoint}")
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return round(ordered[rank] * 1000, 2)
+
+
+def _distribution(values) -> dict:
+    return {
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "p99": _percentile(values, 99),
+        "mean": round(sum(values) / len(values) * 1000, 2) if values else None,
+        "max": round(max(values) * 1000, 2) if values else None,
+    }
+
+
+def _run_endpoint(session_factory, base_url: str, endpoint: str, total: int, concurrency: int,
+                  members: int = DEFAULT_MEMBERS) -> dict:
+    latencies, ttfbs, errors = [], [], []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def one(index):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = session_factory()
+        method, path, kwargs = _request_spec(endpoint, index, members)
+        started = time.perf_counter()
+        try:
+            with session.request(method, base_url + path, stream=True, timeout=120, **kwargs) as response:
+                first_byte = None
+                body = b""
+                for chunk in response.iter_content(chunk_size=None):
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    body += chunk
+                elapsed = time.perf_counter() - started
+            failed = response.status_code >= 400 or "서버 오류 발생".encode("utf-8") in body
+            with lock:
+                latencies.append(elapsed)
+                ttfbs.append(first_byte if first_byte is not None else elapsed)
+                if failed:
+                    errors.append(f"{response.status_code}: {body[:200].decode('utf-8', errors='ignore')}")
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:3],
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": _distribution(latencies),
+        "ttfb_ms": _distribution(ttfbs),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="엔드포인트별 요청 수")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시 요청 수")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="쉼표로 구분한 엔드포인트 목록")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="가짜 LLM 첫 응답 지연(초)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="가짜 LLM 토큰 간 지연(초)")
+    parser.add_argument("--completion-tokens", type=int, default=40, help="가짜 LLM 응답 토큰 수")
+    parser.add_argument("--ocr-latency", type=float, default=0.2, help="가짜 Clova OCR 지연(초)")
+    parser.add_argument("--output", help="결과 JSON 파일 경로 (없으면 표준 출력)")
+    parser.add_argument("--members", type=int, default=DEFAULT_MEMBERS, help="시드한 회원 수 (member_Id 1..N 에 요청 분배)")
+    parser.add_argument("--seed", action="store_true", help="DB 가 비어 있으면 benchmarks.seed 로 먼저 채웁니다")
+    args = parser.parse_args(argv)
+
+    stub_config = StubConfig(args.llm_latency, args.token_delay, args.completion_tokens, args.ocr_latency)
+    stub_server, stub_url = start_stub_server(stub_config)
+    _configure_environment(stub_url)
+    _check_database(args.seed, args.members)
+
+    import requests
+    from werkzeug.serving import make_server
+    from app import app
+
+    app_server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=app_server.serve_forever, name="bench-app", daemon=True).start()
+    base_url = f"http://127.0.0.1:{app_server.server_port}"
+
+    results = {}
+    for endpoint in [name.strip() for name in args.endpoints.split(",") if name.strip()]:
+        print(f"benchmark: {endpoint}", file=sys.stderr)
+        results[endpoint] = _run_endpoint(requests.Session, base_url, endpoint, args.requests, args.concurrency,
+                                          args.members)
+
+    report = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "llm_latency": args.llm_latency,
+            "token_delay": args.token_delay,
+            "completion_tokens": args.completion_tokens,
+            "ocr_latency": args.ocr_latency,
+            "members": args.members,
+        },
+        "endpoints": results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    app_server.shutdown()
+    stub_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+-- 벤치마크용 가계부 스키마 (앱이 조회하는 records / Category 컬럼만 포함)
+CREATE TABLE IF NOT EXISTS Category (
+    category_Id BIGINT NOT NULL PRIMARY KEY,
+    category_name VARCHAR(50) NOT NULL,
+    categoryType TINYINT NOT NULL COMMENT '1 = 수입, 2 = 지출'
+);
+
+CREATE TABLE IF NOT EXISTS records (
+    record_Id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    amount INT NOT NULL,
+    reg_date DATETIME NOT NULL,
+    member_Id BIGINT NOT NULL,
+    category_Id BIGINT NOT NULL,
+    record_memo VARCHAR(255),
+    record_details VARCHAR(1000),
+    delYn TINYINT NOT NULL DEFAULT 0,
+    KEY records_member_date (member_Id, reg_date),
+    KEY records_category (category_Id)
+);
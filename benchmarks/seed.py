@@ -0,0 +1,148 @@
+"""벤치마크용 로컬 MySQL 에 records / Category 스키마를 만들고 대표적인 양의 가계부 기록을 채웁니다.
+
+사용법 (저장소 루트에서):
+    python -m benchmarks.seed --members 50 --records-per-member 2000
+
+DB 는 DB_* 환경 변수로 지정한 로컬 MySQL 을 사용합니다 (기본값: 127.0.0.1:3306/testkb).
+이미 기록이 있으면 건너뛰며, --reset 을 주면 비우고 다시 채웁니다.
+"""
+from datetime import datetime, timedelta
+import argparse
+import os
+import random
+import sys
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schema.sql")
+DEFAULT_MEMBERS = 50
+DEFAULT_RECORDS_PER_MEMBER = 2000
+INSERT_CHUNK_SIZE = 5000
+
+# 수입(categoryType = 1)으로 집계되는 카테고리 ID
+INCOME_CATEGORY_IDS = {"1", "2", "3"}
+
+# 지출 카테고리별 (가중치, 최소 금액, 최대 금액, 메모)
+EXPENSE_PROFILES = {
+    "5": (40, 3000, 60000, "식비"),
+    "11": (15, 1250, 50000, "교통"),
+    "10": (10, 5000, 80000, "여가"),
+    "7": (6, 10000, 150000, "의류"),
+    "8": (6, 3000, 100000, "병원"),
+    "12": (4, 30000, 90000, "통신비"),
+    "4": (4, 20000, 200000, "관리비"),
+    "6": (3, 300000, 900000, "월세"),
+    "9": (4, 10000, 300000, "교육"),
+    "14": (8, 1000, 50000, "기타"),
+}
+
+
+def set_default_environment():
+    """run.py 와 같은 기본 DB 설정을 채웁니다 (이미 지정된 값은 유지)."""
+    for name, value in (("DB_USER", "root"), ("DB_PASSWORD", "root"), ("DB_HOST", "127.0.0.1"),
+                        ("DB_PORT", "3306"), ("DB_NAME", "testkb")):
+        os.environ.setdefault(name, value)
+
+
+def _schema_statements():
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        body = "\n".join(line for line in f.read().splitlines() if not line.lstrip().startswith("--"))
+    return [statement.strip() for statement in body.split(";") if statement.strip()]
+
+
+def _category_rows():
+    from receipt_extractor import CATEGORY_NAMES
+
+    return [
+        {"category_Id": int(category_id), "category_name": names[0],
+         "categoryType": 1 if category_id in INCOME_CATEGORY_IDS else 2}
+        for category_id, names in CATEGORY_NAMES.items()
+    ]
+
+
+def _member_records(rng: random.Random, member_id: int, count: int, today: datetime):
+    """한 회원의 최근 1년치 기록 (매달 급여 + 가중치에 따른 지출, 약 5% 는 삭제 표시)."""
+    rows = []
+    for months_ago in range(12):
+        pay_day = (today.replace(day=25) - timedelta(days=30 * months_ago)).replace(hour=9, minute=0, second=0)
+        if pay_day <= today and len(rows) < count:
+            rows.append({"amount": rng.randrange(2500, 5000) * 1000, "reg_date": pay_day, "member_Id": member_id,
+                         "category_Id": 1, "record_memo": "급여", "record_details": "월급 입금", "delYn": 0})
+
+    category_ids = list(EXPENSE_PROFILES)
+    weights = [EXPENSE_PROFILES[category_id][0] for category_id in category_ids]
+    for category_id in rng.choices(category_ids, weights=weights, k=max(0, count - len(rows))):
+        _, low, high, memo = EXPENSE_PROFILES[category_id]
+        reg_date = today - timedelta(days=rng.randrange(365), seconds=rng.randrange(86400))
+        rows.append({"amount": rng.randrange(low, high) // 100 * 100, "reg_date": reg_date, "member_Id": member_id,
+                     "category_Id": int(category_id), "record_memo": memo,
+                     "record_details": f"{memo} 결제", "delYn": 1 if rng.random() < 0.05 else 0})
+    return rows
+
+
+def database_status() -> dict:
+    """벤치마크 DB 에 테이블이 있는지와 기록 수를 반환합니다 (연결할 수 없으면 예외)."""
+    from sqlalchemy import text
+    from db import get_connection
+
+    with get_connection() as connection:
+        tables = {name.lower() for name in connection.execute(text(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()"
+        )).scalars()}
+        status = {"records_table": "records" in tables, "category_table": "category" in tables, "records": 0}
+        if status["records_table"]:
+            status["records"] = connection.execute(text("SELECT COUNT(*) FROM records")).scalar()
+        return status
+
+
+def seed_database(members: int = DEFAULT_MEMBERS, records_per_member: int = DEFAULT_RECORDS_PER_MEMBER,
+                  reset: bool = False, seed: int = 42) -> int:
+    """스키마를 만들고 기록이 비어 있으면 채웁니다. 새로 넣은 기록 수를 반환합니다."""
+    from sqlalchemy import text
+    from db import get_database_engine
+
+    engine = get_database_engine()
+    with engine.begin() as connection:
+        for statement in _schema_statements():
+            connection.execute(text(statement))
+        if reset:
+            connection.execute(text("DELETE FROM records"))
+        if not reset and connection.execute(text("SELECT COUNT(*) FROM records")).scalar():
+            return 0
+        connection.execute(text("DELETE FROM Category"))
+        connection.execute(text(
+            "INSERT INTO Category (category_Id, category_name, categoryType) "
+            "VALUES (:category_Id, :category_name, :categoryType)"
+        ), _category_rows())
+
+    rng = random.Random(seed)
+    today = datetime.now().replace(microsecond=0)
+    insert = text("INSERT INTO records (amount, reg_date, member_Id, category_Id, record_memo, record_details, delYn) "
+                  "VALUES (:amount, :reg_date, :member_Id, :category_Id, :record_memo, :record_details, :delYn)")
+    inserted, pending = 0, []
+    for member_id in range(1, members + 1):
+        pending.extend(_member_records(rng, member_id, records_per_member, today))
+        if len(pending) >= INSERT_CHUNK_SIZE or member_id == members:
+            with engine.begin() as connection:
+                connection.execute(insert, pending)
+            inserted += len(pending)
+            pending = []
+    return inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=DEFAULT_MEMBERS, help="회원 수 (member_Id 1..N)")
+    parser.add_argument("--records-per-member", type=int, default=DEFAULT_RECORDS_PER_MEMBER, help="회원별 기록 수")
+    parser.add_argument("--reset", action="store_true", help="기존 기록을 지우고 다시 채웁니다")
+    parser.add_argument("--seed", type=int, default=42, help="난수 시드 (같은 값이면 같은 데이터)")
+    args = parser.parse_args(argv)
+
+    set_default_environment()
+    inserted = seed_database(args.members, args.records_per_member, args.reset, args.seed)
+    if inserted:
+        print(f"기록 {inserted}건을 채웠습니다.")
+    else:
+        print("이미 기록이 있어 건너뜁니다 (--reset 으로 다시 채울 수 있습니다).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
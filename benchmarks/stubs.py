@@ -0,0 +1,148 @@
+"""벤치마크용 로컬 가짜 서버 (OpenAI 호환 API, Clova OCR, 뉴스 검색/기사 페이지)"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+import uuid
+
+RECEIPT_JSON = json.dumps({
+    "amount": "9500",
+    "reg_date": "2024-07-15 12:34:56",
+    "member_Id": 1,
+    "category_Id": "식비",
+    "record_memo": "스타벅스 커피",
+    "record_details": "카페에서 커피 두 잔을 구매했어요",
+    "delYn": 0,
+}, ensure_ascii=False)
+
+RECEIPT_TEXT = ("스타벅스 강남점 상호: 스타벅스코리아 강남점 2024-07-15 12:34:56 "
+                "아메리카노 4,500 카페라떼 5,000 합계 9,500 결제금액 9,500원")
+
+ARTICLE_BODY = "KB금융이 새로운 금융 서비스를 출시했습니다. " * 40
+
+
+class StubConfig:
+    """가짜 서버 지연 시간 설정 (초 단위)"""
+
+    def __init__(self, llm_latency=0.3, token_delay=0.01, completion_tokens=40, ocr_latency=0.2, news_latency=0.05):
+        self.llm_latency = llm_latency
+        self.token_delay = token_delay
+        self.completion_tokens = completion_tokens
+        self.ocr_latency = ocr_latency
+        self.news_latency = news_latency
+
+
+def _completion_text(messages, config: StubConfig) -> str:
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    if "SQL Query:" in prompt:
+        return "SELECT 1 AS total_expense"
+    if "record_memo" in prompt:
+        return RECEIPT_JSON
+    return " ".join(["키키가"] + ["알려줄게"] * (config.completion_tokens - 1))
+
+
+def _make_handler(config: StubConfig):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, body: dict, status: int = 200):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_html(self, html: str):
+            data = html.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def do_GET(self):
+            time.sleep(config.news_latency)
+            if self.path.startswith("/search"):
+                links = "".join(
+                    f'<a class="news_tit" href="http://{self.headers["Host"]}/article/{n}">기사 {n}</a>'
+                    for n in range(1, 11)
+                )
+                self._send_html(f"<html><body>{links}</body></html>")
+            elif self.path.startswith("/article/"):
+                self._send_html(f"<html><body><article><p>{ARTICLE_BODY}</p></article></body></html>")
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            body = self._read_body()
+            if self.path.endswith("/chat/completions"):
+                self._chat_completions(json.loads(body))
+            elif self.path.startswith("/ocr"):
+                time.sleep(config.ocr_latency)
+                self._send_json({"images": [{"fields": [{"inferText": word} for word in RECEIPT_TEXT.split()]}]})
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def _chat_completions(self, request_body: dict):
+            time.sleep(config.llm_latency)
+            model = request_body.get("model", "stub")
+            text = _completion_text(request_body.get("messages", []), config)
+            words = text.split(" ")
+            usage = {"prompt_tokens": 100, "completion_tokens": len(words), "total_tokens": 100 + len(words)}
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+            if not request_body.get("stream"):
+                self._send_json({
+                    "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send_event(payload):
+                data = f"data: {payload}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def chunk(delta, finish_reason=None, chunk_usage=None):
+                body = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                if chunk_usage is not None:
+                    body["choices"] = []
+                    body["usage"] = chunk_usage
+                return json.dumps(body, ensure_ascii=False)
+
+            try:
+                send_event(chunk({"role": "assistant", "content": ""}))
+                for index, word in enumerate(words):
+                    time.sleep(config.token_delay)
+                    send_event(chunk({"content": word if index == 0 else " " + word}))
+                send_event(chunk({}, "stop"))
+                if (request_body.get("stream_options") or {}).get("include_usage"):
+                    send_event(chunk({}, chunk_usage=usage))
+                send_event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return StubHandler
+
+
+def start_stub_server(config: StubConfig, host: str = "127.0.0.1", port: int = 0):
+    """가짜 서버를 백그라운드 스레드로 띄우고 (서버, 기본 URL) 을 반환합니다."""
+    server = ThreadingHTTPServer((host, port), _make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="bench-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
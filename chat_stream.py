@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import threading
+import time
+
+from langchain_openai import ChatOpenAI
+from langchain.schema import HumanMessage, SystemMessage
+
+from metrics import in_request_context, observe_stage, record_tokens
+
+CHAT_MAX_WORKERS = int(os.getenv('CHAT_MAX_WORKERS', '8'))
+CHAT_MAX_PENDING = int(os.getenv('CHAT_MAX_PENDING', '16'))
+CHAT_QUEUE_SIZE = int(os.getenv('CHAT_QUEUE_SIZE', '256'))
+CHAT_SEND_TIMEOUT = float(os.getenv('CHAT_SEND_TIMEOUT', '30'))
+
+SYSTEM_PROMPT = "너는 사람과 대화하는 친절한 가계부 AI 키키 야.   "
+
+_executor = ThreadPoolExecutor(max_workers=CHAT_MAX_WORKERS, thread_name_prefix="chat-stream")
+# 실행 중 + 대기 중인 스트림 수 제한 (가득 차면 429)
+_admission = threading.BoundedSemaphore(CHAT_MAX_WORKERS + CHAT_MAX_PENDING)
+
+_chat = None
+_chat_lock = threading.Lock()
+
+
+def get_chat_model() -> ChatOpenAI:
+    """스트리밍용 ChatOpenAI 클라이언트를 한 번만 만들어 공유합니다."""
+    global _chat
+    if _chat is None:
+        with _chat_lock:
+            if _chat is None:
+                _chat = ChatOpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'),
+                    verbose=True,
+                    streaming=True,
+                    stream_usage=True,
+                    temperature=0.7,
+                )
+    return _chat
+
+
+class ThreadedGenerator:
+    """LLM 스레드가 넣은 토큰을 응답으로 내보내는 제한된 크기의 큐.
+
+    큐가 가득 차면 생산자가 기다리고(backpressure), 응답이 닫히면(클라이언트 연결 종료) 생산을 중단시킵니다.
+    """
+
+    def __init__(self, maxsize: int = CHAT_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.cancelled = threading.Event()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self.queue.get()
+        if item is StopIteration:
+            raise item
+        return item
+
+    def send(self, data) -> bool:
+        """토큰을 넣습니다. 취소되었거나 소비자가 너무 오래 읽지 않으면 False 를 반환합니다."""
+        waited = 0.0
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(data, timeout=0.5)
+                return True
+            except queue.Full:
+                waited += 0.5
+                if waited >= CHAT_SEND_TIMEOUT:
+                    self.cancelled.set()
+        return False
+
+    def finish(self):
+        """생산자 쪽에서 스트림 끝을 알립니다."""
+        try:
+            self.queue.put_nowait(StopIteration)
+        except queue.Full:
+            if not self.cancelled.is_set():
+                self.queue.put(StopIteration)
+
+    def close(self):
+        """응답이 닫힐 때 WSGI 서버가 호출합니다. 상류 LLM 스트림을 중단시킵니다."""
+        self.cancelled.set()
+
+
+def llm_thread(g, prompt, history=None, on_complete=None):
+    messages = [SystemMessage(content=SYSTEM_PROMPT), *(history or []), HumanMessage(content=prompt)]
+    tokens = []
+    completed = False
+    started = time.perf_counter()
+    try:
+        for chunk in get_chat_model().stream(messages):
+            usage = getattr(chunk, "usage_metadata", None)
+            if usage:
+                record_tokens("chatbot", usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+            if not chunk.content:
+                continue
+            if not tokens:
+                observe_stage("chat_ttft", time.perf_counter() - started)
+            if not g.send(chunk.content):
+                # 클라이언트가 떠났으면 스트림을 닫아 더 이상 토큰 비용을 쓰지 않습니다
+                break
+            tokens.append(chunk.content)
+        else:
+            completed = True
+    except Exception as e:
+        g.send(f"서버 오류 발생: {e}\n")
+    finally:
+        observe_stage("chat_stream", time.perf_counter() - started)
+        g.finish()
+        _admission.release()
+
+    if completed and on_complete is not None:
+        try:
+            on_complete("".join(tokens))
+        except Exception as e:
+            print(f"대화 기록 저장 중 오류 발생: {e}")
+
+
+def chain_stream(prompt, history=None, on_complete=None):
+    """스트리밍 응답 생성기를 반환합니다. 처리 한도를 넘으면 None 을 반환합니다.
+
+    history 는 프롬프트 앞에 붙일 이전 대화, on_complete 는 답변이 끝까지 생성되면 전체 답변으로 호출됩니다.
+    """
+    if not _admission.acquire(blocking=False):
+        return None
+    g = ThreadedGenerator()
+    try:
+        _executor.submit(in_request_context(llm_thread), g, prompt, history, on_complete)
+    except Exception:
+        _admission.release()
+        raise
+    return g
@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import os
+import threading
+
+from langchain_openai import ChatOpenAI
+from langchain.schema import HumanMessage, AIMessage, SystemMessage
+
+from metrics import timed, token_config
+
+CHAT_MEMORY_MAX_TOKENS = int(os.getenv('CHAT_MEMORY_MAX_TOKENS', '80'))
+CHAT_MEMORY_MAX_SESSIONS = int(os.getenv('CHAT_MEMORY_MAX_SESSIONS', '10000'))
+CHAT_MEMORY_MAX_CHARS = int(os.getenv('CHAT_MEMORY_MAX_CHARS', str(20 * 1024 * 1024)))
+CHAT_MEMORY_SUMMARY_WORKERS = int(os.getenv('CHAT_MEMORY_SUMMARY_WORKERS', '2'))
+# 요약이 밀려도 세션 하나가 무한히 커지지 않도록 버퍼에 남길 최대 메시지 수
+CHAT_MEMORY_MAX_MESSAGES = int(os.getenv('CHAT_MEMORY_MAX_MESSAGES', '40'))
+
+SUMMARY_PROMPT = """지금까지의 대화 요약과 새로 오간 대화를 보고, 요약을 짧게 갱신해줘.
+
+현재 요약:
+{summary}
+
+새 대화:
+{new_lines}
+
+갱신된 요약:"""
+
+
+@dataclass
+class ConversationState:
+    """사용자 한 명의 대화 요약과 아직 요약되지 않은 최근 메시지"""
+    summary: str = ""
+    messages: list = field(default_factory=list)
+    summarizing: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # 저장소 전체 합계에 반영된 크기 (저장소 잠금 안에서만 갱신)
+    chars: int = 0
+
+    def size(self) -> int:
+        return len(self.summary) + sum(len(message.content) for message in self.messages)
+
+
+class ConversationMemoryStore:
+    """사용자(세션)별 대화 메모리. LRU 로 오래된 세션을 내보내고, 요약은 백그라운드에서 수행합니다."""
+
+    def __init__(self, max_token_limit: int = CHAT_MEMORY_MAX_TOKENS, max_sessions: int = CHAT_MEMORY_MAX_SESSIONS,
+                 max_chars: int = CHAT_MEMORY_MAX_CHARS, summary_workers: int = CHAT_MEMORY_SUMMARY_WORKERS):
+        self.max_token_limit = max_token_limit
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self._sessions = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=summary_workers, thread_name_prefix="chat-summary")
+        self._llm = None
+
+    def _get_llm(self) -> ChatOpenAI:
+        if self._llm is None:
+            self._llm = ChatOpenAI(api_key=os.getenv('OPENAI_API_KEY'), temperature=0.1)
+        return self._llm
+
+    def _get_state(self, key) -> ConversationState:
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is None:
+                state = self._sessions[key] = ConversationState()
+            self._sessions.move_to_end(key)
+            return state
+
+    def _update_size(self, key, state: ConversationState, size: int):
+        """세션 크기 변화를 전체 합계에 반영합니다. 이미 내보낸 세션이면 무시합니다."""
+        with self._lock:
+            if self._sessions.get(key) is state:
+                self._chars += size - state.chars
+                state.chars = size
+
+    def _evict(self):
+        """세션 수와 전체 메모리 한도를 넘으면 가장 오래 쓰이지 않은 세션부터 제거합니다."""
+        with self._lock:
+            while self._sessions and (len(self._sessions) > self.max_sessions or self._chars > self.max_chars):
+                _, state = self._sessions.popitem(last=False)
+                self._chars -= state.chars
+
+    def load(self, key) -> list:
+        """요청 시점에 사용할 수 있는 최신 요약 + 최근 메시지를 반환합니다 (요약을 기다리지 않음)."""
+        state = self._get_state(key)
+        with state.lock:
+            history = list(state.messages)
+            summary = state.summary
+        if summary:
+            history.insert(0, SystemMessage(content=f"이전 대화 요약: {summary}"))
+        return history
+
+    def add_turn(self, key, question: str, answer: str):
+        """질문/답변을 기록하고, 버퍼가 한도를 넘으면 백그라운드 요약을 예약합니다."""
+        state = self._get_state(key)
+        with state.lock:
+            state.messages.extend([HumanMessage(content=question), AIMessage(content=answer)])
+            if len(state.messages) > CHAT_MEMORY_MAX_MESSAGES:
+                del state.messages[:len(state.messages) - CHAT_MEMORY_MAX_MESSAGES]
+            schedule = not state.summarizing and self._count_tokens(state.messages) > self.max_token_limit
+            if schedule:
+                state.summarizing = True
+            size = state.size()
+
+        self._update_size(key, state, size)
+        if schedule:
+            self._executor.submit(self._summarize, key, state)
+        self._evict()
+
+    def _count_tokens(self, messages) -> int:
+        try:
+            return self._get_llm().get_num_tokens_from_messages(messages)
+        except Exception:
+            # 토크나이저를 쓸 수 없으면 글자 수로 대략 계산
+            return sum(len(message.content) for message in messages) // 2
+
+    def _summarize(self, key, state: ConversationState):
+        """한도를 넘는 오래된 메시지를 요약에 합치고 버퍼에서 제거합니다."""
+        try:
+            with state.lock:
+                messages = list(state.messages)
+                summary = state.summary
+
+            # 최근 메시지가 한도 안에 들어올 때까지 앞쪽 메시지를 요약 대상으로 넘깁니다
+            cut = 0
+            while cut < len(messages) and self._count_tokens(messages[cut:]) > self.max_token_limit:
+                cut += 1
+            if cut == 0:
+                return
+
+            new_lines = "\n".join(
+                f"{'Human' if isinstance(message, HumanMessage) else 'AI'}: {message.content}"
+                for message in messages[:cut]
+            )
+            with timed("chat_summary_llm"):
+                new_summary = self._get_llm().invoke(
+                    SUMMARY_PROMPT.format(summary=summary or "(없음)", new_lines=new_lines),
+                    config=token_config("chat_summary"),
+                ).content.strip()
+
+            with state.lock:
+                # 요약하는 동안 잘려 나간 메시지가 있으면 그만큼만 제거합니다
+                summarized = {id(message) for message in messages[:cut]}
+                state.messages = [message for message in state.messages if id(message) not in summarized]
+                state.summary = new_summary
+                size = state.size()
+            self._update_size(key, state, size)
+        except Exception as e:
+            print(f"대화 요약 중 오류 발생: {e}")
+        finally:
+            with state.lock:
+                state.summarizing = False
+
+    def clear(self, key):
+        with self._lock:
+            state = self._sessions.pop(key, None)
+            if state is not None:
+                self._chars -= state.chars
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "chars": self._chars,
+            }
+
+
+memory_store = ConversationMemoryStore()
@@ -1,9 +1,42 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
 import os
+import threading
+import time
 
-def get_database_engine() -> Engine:
+# 프로세스 전체에서 공유하는 엔진/세션 팩토리 (최초 사용 시 생성)
+_engine = None
+_session_factory = None
+_engine_lock = threading.Lock()
+
+# 커넥션 풀 대기 시간 / 새 커넥션 연결 시간 통계
+_pool_stats_lock = threading.Lock()
+_pool_stats = {
+    "checkouts": 0,
+    "total_wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+    "connects": 0,
+    "total_connect_seconds": 0.0,
+    "max_connect_seconds": 0.0,
+}
+# 체크아웃 중인 스레드에서 새 커넥션을 여는 데 걸린 시간 (풀 이벤트에서 기록)
+_checkout_timing = threading.local()
+
+
+def _get_pool_options() -> dict:
+    """환경 변수에서 커넥션 풀 설정을 읽어옵니다."""
+    return {
+        "pool_size": int(os.getenv('DB_POOL_SIZE', '5')),
+        "max_overflow": int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        "pool_recycle": int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        "pool_timeout": int(os.getenv('DB_POOL_TIMEOUT', '30')),
+        "pool_pre_ping": os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+    }
+
+
+def _create_database_engine() -> Engine:
     """환경 변수를 사용하여 데이터베이스 연결 엔진을 생성합니다."""
     db_user = os.getenv('DB_USER')
     db_password = os.getenv('DB_PASSWORD')
@@ -12,14 +45,151 @@ def get_database_engine() -> Engine:
     db_name = os.getenv('DB_NAME')
 
     connection_string = f"mysql+mysqlconnector://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-    engine = create_engine(connection_string)
+    engine = create_engine(connection_string, **_get_pool_options())
+    event.listen(engine, "do_connect", _on_do_connect)
+    event.listen(engine, "connect", _on_connect)
+    event.listen(engine, "checkout", _on_checkout)
     return engine
 
+
+def _on_do_connect(dialect, connection_record, cargs, cparams):
+    _checkout_timing.connect_started = time.perf_counter()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    started = getattr(_checkout_timing, "connect_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    _checkout_timing.connect_started = None
+    _checkout_timing.connect_seconds = getattr(_checkout_timing, "connect_seconds", 0.0) + elapsed
+    with _pool_stats_lock:
+        _pool_stats["connects"] += 1
+        _pool_stats["total_connect_seconds"] += elapsed
+        if elapsed > _pool_stats["max_connect_seconds"]:
+            _pool_stats["max_connect_seconds"] = elapsed
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _checkout_timing.checked_out_at = time.perf_counter()
+
+
+def _record_wait(elapsed: float):
+    with _pool_stats_lock:
+        _pool_stats["checkouts"] += 1
+        _pool_stats["total_wait_seconds"] += elapsed
+        if elapsed > _pool_stats["max_wait_seconds"]:
+            _pool_stats["max_wait_seconds"] = elapsed
+
+
+def get_database_engine() -> Engine:
+    """프로세스 전체에서 공유하는 데이터베이스 엔진을 반환합니다 (최초 호출 시 생성)."""
+    global _engine, _session_factory
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = _create_database_engine()
+                _session_factory = sessionmaker(bind=engine)
+                _engine = engine
+    return _engine
+
+
+@contextmanager
+def get_connection():
+    """풀에서 커넥션을 빌려오고, 대기 시간을 기록한 뒤 반납합니다.
+
+    대기 시간은 체크아웃 이벤트까지의 시간에서 새 커넥션을 여는 시간을 뺀 값입니다 (연결 시간은 따로 집계).
+    """
+    engine = get_database_engine()
+    _checkout_timing.connect_seconds = 0.0
+    _checkout_timing.checked_out_at = None
+    started = time.perf_counter()
+    connection = engine.connect()
+    checked_out_at = _checkout_timing.checked_out_at or time.perf_counter()
+    _record_wait(max(0.0, checked_out_at - started - _checkout_timing.connect_seconds))
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
 def get_session():
     """SQLAlchemy 세션을 반환합니다."""
+    get_database_engine()
+    return _session_factory()
+
+
+@contextmanager
+def session_scope():
+    """세션을 열고, 예외 시 롤백하며, 종료 시 반드시 닫습니다."""
+    session = get_session()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def warm_up_pool(connections: int = None) -> int:
+    """서버 시작 시 풀에 커넥션을 미리 열어둡니다. 성공한 커넥션 수를 반환합니다."""
     engine = get_database_engine()
-    Session = sessionmaker(bind=engine)
-    return Session()
+    if connections is None:
+        connections = engine.pool.size()
+
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            opened.append(connection)
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        print(f"커넥션 풀 워밍업 중 오류 발생: {e}")
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+
+def get_pool_stats() -> dict:
+    """커넥션 풀 사용 현황(체크아웃, 오버플로, 대기 시간)을 반환합니다."""
+    if _engine is None:
+        return {"initialized": False}
+
+    pool = _engine.pool
+    with _pool_stats_lock:
+        checkouts = _pool_stats["checkouts"]
+        total_wait = _pool_stats["total_wait_seconds"]
+        max_wait = _pool_stats["max_wait_seconds"]
+        connects = _pool_stats["connects"]
+        total_connect = _pool_stats["total_connect_seconds"]
+        max_connect = _pool_stats["max_connect_seconds"]
+
+    return {
+        "initialized": True,
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": checkouts,
+        "avg_wait_seconds": total_wait / checkouts if checkouts else 0.0,
+        "max_wait_seconds": max_wait,
+        "connects": connects,
+        "avg_connect_seconds": total_connect / connects if connects else 0.0,
+        "max_connect_seconds": max_connect,
+    }
+
+
+def dispose_engine():
+    """공유 엔진을 폐기합니다 (fork 이후 워커에서 호출)."""
+    global _engine, _session_factory
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _session_factory = None
+
 
 def test_database_connection(engine: Engine) -> bool:
     """데이터베이스 연결 테스트를 수행합니다."""
@@ -33,3 +203,4 @@ def test_database_connection(engine: Engine) -> bool:
         return False
 if __name__ == "__main__":
     print(test_database_connection(get_database_engine()))
+    print(get_pool_stats())
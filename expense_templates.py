@@ -0,0 +1,178 @@
+from dataclasses import dataclass, field
+from datetime import date
+import re
+
+# 가계부 테이블/컬럼 이름
+RECORDS_TABLE = "records"
+CATEGORY_TABLE = "Category"
+ROLLUP_TABLE = "monthly_rollup"  # 회원/월/카테고리별 합계 (rollups.py 에서 관리)
+INCOME_CATEGORY_TYPE = 1  # Category.categoryType: 1 = 수입, 2 = 지출
+EXPENSE_CATEGORY_TYPE = 2
+
+PERIOD_EXPENSE_SQL = f"""SELECT COUNT(*) AS expense_count, COALESCE(SUM(r.amount), 0) AS total_expense
+FROM {RECORDS_TABLE} r
+JOIN {CATEGORY_TABLE} c ON r.category_Id = c.category_Id
+WHERE r.member_Id = :member_Id
+  AND c.categoryType = :category_type
+  AND r.delYn = 0
+  AND r.reg_date >= :start_date
+  AND r.reg_date < :end_date"""
+
+TOTAL_EXPENSE_SQL = f"""SELECT COUNT(*) AS expense_count, COALESCE(SUM(r.amount), 0) AS total_expense
+FROM {RECORDS_TABLE} r
+JOIN {CATEGORY_TABLE} c ON r.category_Id = c.category_Id
+WHERE r.member_Id = :member_Id
+  AND c.categoryType = :category_type
+  AND r.delYn = 0"""
+
+# 월 단위 기간은 월별 집계 테이블로 O(개월 수) 에 답할 수 있습니다
+ROLLUP_PERIOD_EXPENSE_SQL = f"""SELECT COALESCE(SUM(m.record_count), 0) AS expense_count, COALESCE(SUM(m.total), 0) AS total_expense
+FROM {ROLLUP_TABLE} m
+JOIN {CATEGORY_TABLE} c ON m.category_Id = c.category_Id
+WHERE m.member_Id = :member_Id
+  AND c.categoryType = :category_type
+  AND m.ym >= LEFT(:start_date, 7)
+  AND m.ym < LEFT(:end_date, 7)"""
+
+ROLLUP_TOTAL_EXPENSE_SQL = f"""SELECT COALESCE(SUM(m.record_count), 0) AS expense_count, COALESCE(SUM(m.total), 0) AS total_expense
+FROM {ROLLUP_TABLE} m
+JOIN {CATEGORY_TABLE} c ON m.category_Id = c.category_Id
+WHERE m.member_Id = :member_Id
+  AND c.categoryType = :category_type"""
+
+RECENT_EXPENSE_SQL = f"""SELECT r.reg_date, r.amount, r.record_memo, r.category_Id
+FROM {RECORDS_TABLE} r
+JOIN {CATEGORY_TABLE} c ON r.category_Id = c.category_Id
+WHERE r.member_Id = :member_Id
+  AND c.categoryType = :category_type
+  AND r.delYn = 0
+ORDER BY r.reg_date DESC
+LIMIT :row_limit"""
+
+NET_ASSETS_SQL = f"""SELECT COALESCE(SUM(CASE WHEN c.categoryType = :income_type THEN r.amount ELSE 0 END), 0) AS total_income,
+       COALESCE(SUM(CASE WHEN c.categoryType = :expense_type THEN r.amount ELSE 0 END), 0) AS total_expense,
+       COALESCE(SUM(CASE WHEN c.categoryType = :income_type THEN r.amount ELSE 0 END), 0)
+         - COALESCE(SUM(CASE WHEN c.categoryType = :expense_type THEN r.amount ELSE 0 END), 0) AS net_assets
+FROM {RECORDS_TABLE} r
+JOIN {CATEGORY_TABLE} c ON r.category_Id = c.category_Id
+WHERE r.member_Id = :member_Id
+  AND r.delYn = 0"""
+
+RECENT_ROW_LIMIT = 10
+
+
+@dataclass
+class TemplateQuery:
+    """템플릿으로 만든 파라미터화된 SQL 쿼리"""
+    name: str
+    sql: str
+    params: dict = field(default_factory=dict)
+
+
+def _month_range(year: int, month: int):
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def _shift_month(year: int, month: int, delta: int):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def _normalize_year(raw: str) -> int:
+    year = int(raw)
+    return 2000 + year if year < 100 else year
+
+
+def _period_query(name: str, start: date, end: date) -> TemplateQuery:
+    return TemplateQuery(name, PERIOD_EXPENSE_SQL, {
+        "category_type": EXPENSE_CATEGORY_TYPE,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+    })
+
+
+def _year_month(match, today: date):
+    month = int(match.group("month"))
+    if not 1 <= month <= 12:
+        return None
+    if match.groupdict().get("year"):
+        year = _normalize_year(match.group("year"))
+    else:
+        # 연도 없이 아직 오지 않은 달을 물으면 작년 그 달로 봅니다 (1월에 "7월에 얼마 썼어")
+        year = today.year - 1 if month > today.month else today.year
+    return _period_query("month_expense", *_month_range(year, month))
+
+
+def _this_year(match, today: date):
+    return _period_query("year_expense", date(today.year, 1, 1), date(today.year + 1, 1, 1))
+
+
+def _all_time(match, today: date):
+    return TemplateQuery("total_expense", TOTAL_EXPENSE_SQL, {"category_type": EXPENSE_CATEGORY_TYPE})
+
+
+def _last_month(match, today: date):
+    return _period_query("last_month_expense", *_month_range(*_shift_month(today.year, today.month, -1)))
+
+
+def _this_month(match, today: date):
+    return _period_query("this_month_expense", *_month_range(today.year, today.month))
+
+
+def _recent(match, today: date):
+    return TemplateQuery("recent_expense", RECENT_EXPENSE_SQL, {
+        "category_type": EXPENSE_CATEGORY_TYPE,
+        "row_limit": RECENT_ROW_LIMIT,
+    })
+
+
+def _net_assets(match, today: date):
+    return TemplateQuery("net_assets", NET_ASSETS_SQL, {
+        "income_type": INCOME_CATEGORY_TYPE,
+        "expense_type": EXPENSE_CATEGORY_TYPE,
+    })
+
+
+# (패턴, 쿼리 생성 함수) - is_expense_query 의 구체적인 문장 패턴과 동일
+EXPENSE_TEMPLATES = [
+    (r"(?P<year>\d{4}|\d{2})\s*년\s*(?P<month>\d{1,2})\s*월\s*에\s*얼마\s*썼어", _year_month),  # 2024년 7월에 얼마 썼어 / 24년 7월에 얼마 썼어
+    (r"(?<!\d)(?P<month>\d{1,2})\s*월\s*에\s*얼마\s*썼어", _year_month),                      # 7월에 얼마 썼어
+    (r"올해\s*얼마나\s*많이\s*돈\s*을\s*썼(어|지)", _this_year),                               # 올해 얼마나 많이 돈을 썼어/썼지
+    (r"여태까지\s*쓴\s*지출\s*내역", _all_time),                                              # 여태까지 쓴 지출 내역 알려줘
+    (r"지난\s*달\s*소비\s*내역", _last_month),                                                # 지난 달 소비 내역 알려줘
+    (r"이번\s*달\s*지출", _this_month),                                                       # 이번 달 지출 알려줘
+    (r"최근\s*소비\s*기록", _recent),                                                         # 최근 소비 기록 알려줘
+    (r"(현재|지금)\s*(내\s*)?자산|자산\s*(이|은)?\s*얼마", _net_assets),                        # 현재 자산 알려줘 / 내 자산이 얼마야
+]
+
+_COMPILED_TEMPLATES = [(re.compile(pattern), builder) for pattern, builder in EXPENSE_TEMPLATES]
+
+
+_ROLLUP_SQL = {
+    PERIOD_EXPENSE_SQL: ROLLUP_PERIOD_EXPENSE_SQL,
+    TOTAL_EXPENSE_SQL: ROLLUP_TOTAL_EXPENSE_SQL,
+}
+
+
+def match_expense_template(user_question: str, member_id, today: date = None, use_rollups: bool = False):
+    """정해진 지출 질문 패턴이면 해당 회원의 TemplateQuery 를, 아니면 None 을 반환합니다 (None 이면 LLM 으로 생성).
+
+    템플릿 쿼리는 회원 한 명의 기록만 집계하므로 member_id 가 없으면 None 을 반환합니다.
+    use_rollups 가 True 이면 월 단위 합계 질문은 월별 집계 테이블을 조회하는 쿼리로 바꿉니다.
+    """
+    if member_id is None:
+        return None
+    today = today or date.today()
+    for pattern, builder in _COMPILED_TEMPLATES:
+        match = pattern.search(user_question)
+        if match:
+            query = builder(match, today)
+            if query is None:
+                return None
+            query.params["member_Id"] = member_id
+            if use_rollups and query.sql in _ROLLUP_SQL:
+                query.sql = _ROLLUP_SQL[query.sql]
+            return query
+    return None
@@ -0,0 +1,260 @@
+from dataclasses import dataclass, field
+import json
+import os
+import re
+import threading
+
+from expense_templates import EXPENSE_TEMPLATES
+
+CHAT_INTENT = "chatbot"
+
+# (intent, 패턴) - 앞에 있는 규칙일수록 우선순위가 높습니다
+DEFAULT_RULES = [
+    ("summarize-news", r"뉴스"),
+    # ("parse-ocr", r"OCR"),
+    *[("execute-sql", pattern) for pattern, _ in EXPENSE_TEMPLATES],
+    *[("execute-sql", keyword) for keyword in ("소비", "얼마", "지출", "수입", "수익", "내역", "자산")],
+]
+
+_GROUP_NAME = re.compile(r"\(\?P([<=])(\w+)")
+_META_CHARS = set(".^$*+?{}[]\\|()")
+
+
+def _split_top_level(pattern: str):
+    """패턴을 괄호/문자 클래스 밖의 | 기준으로 나눕니다."""
+    parts, start, depth, in_class, index = [], 0, 0, False, 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\":
+            index += 2
+            continue
+        if in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            parts.append(pattern[start:index])
+            start = index + 1
+        index += 1
+    parts.append(pattern[start:])
+    return parts
+
+
+def _literal_keywords(pattern: str):
+    """패턴이 순수 문자열(또는 문자열들의 | 조합)이면 키워드 목록을, 아니면 None 을 반환합니다."""
+    keywords = pattern.split("|")
+    if all(keywords) and not any(_META_CHARS.intersection(keyword) for keyword in keywords):
+        return keywords
+    return None
+
+
+def _first_char(pattern: str):
+    """패턴이 반드시 같은 글자로 시작하면 그 글자를, 알 수 없으면 None 을 반환합니다 (보수적으로 판단)."""
+    if not pattern or pattern[0] in _META_CHARS or len(_split_top_level(pattern)) > 1:
+        return None
+    if len(pattern) > 1 and pattern[1] in "?*{":
+        return None  # 첫 글자가 생략될 수 있음
+    return pattern[0]
+
+
+def _trie_regex(keywords) -> str:
+    """키워드 목록을 접두어 트리 형태의 정규식으로 만듭니다 (위치마다 첫 글자로 바로 분기)."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ""
+        if len(alternatives) == 1 and "" not in node:
+            return alternatives[0]
+        return f"(?:{'|'.join(alternatives)})" + ("?" if "" in node else "")
+
+    return build(trie)
+
+
+@dataclass
+class RouteResult:
+    """라우팅 결과 (intent 와 패턴에서 뽑아낸 슬롯)"""
+    intent: str
+    slots: dict = field(default_factory=dict)
+    rule_index: int = -1
+
+
+class IntentRouter:
+    """intent 규칙을 키워드 트리와 정규식 대안 두 패턴으로 컴파일해 규칙 수와 무관한 스캔으로 라우팅합니다."""
+
+    def __init__(self, rules=None, default_intent: str = CHAT_INTENT):
+        self.default_intent = default_intent
+        self._rules = []
+        self._lock = threading.Lock()
+        for intent, pattern in rules or []:
+            self._rules.append((intent, pattern))
+        self._compile()
+
+    @staticmethod
+    def _prefix_groups(index: int, pattern: str) -> str:
+        """규칙별 슬롯 그룹 이름이 겹치지 않도록 접두어를 붙입니다."""
+        return _GROUP_NAME.sub(lambda m: f"(?P{m.group(1)}_r{index}__{m.group(2)}", pattern)
+
+    def _compile(self):
+        """키워드 규칙은 접두어 트리 하나로, 정규식 규칙은 우선순위 순서의 대안 하나로 합칩니다.
+
+        두 패턴 모두 폭이 0인 전방 탐색으로 감싸 매칭이 글자를 소비하지 않으므로, 위치마다 그 위치에서
+        매칭되는 가장 우선순위가 높은 규칙이 나오고, 그중 최솟값이 입력 전체에서 우선순위가 가장 높은 규칙입니다.
+        """
+        keyword_index = {}
+        slot_groups = {}
+        runs = []  # (첫 글자 집합 또는 None, 대안 목록) - 규칙 순서를 유지한 묶음
+        for index, (_, pattern) in enumerate(self._rules):
+            keywords = _literal_keywords(pattern)
+            if keywords:
+                for keyword in keywords:
+                    keyword_index.setdefault(keyword, index)
+                continue
+
+            # 빈 표식 그룹을 뒤에 두어 lastgroup 으로 규칙을 찾습니다
+            alternative = f"(?:{self._prefix_groups(index, pattern)})(?P<_r{index}>)"
+            slot_groups[index] = [(name, f"_r{index}__{name}") for name in re.compile(pattern).groupindex]
+            char = _first_char(pattern)
+            if runs and (runs[-1][0] is None) == (char is None):
+                if char is not None:
+                    runs[-1][0].add(re.escape(char))
+                runs[-1][1].append(alternative)
+            else:
+                runs.append(({re.escape(char)} if char is not None else None, [alternative]))
+
+        # 트리는 가장 긴 키워드를 매칭하므로, 그 안에 포함된 짧은 키워드의 우선순위도 반영합니다
+        self._keyword_index = {
+            keyword: min(other_index for other, other_index in keyword_index.items() if keyword.startswith(other))
+            for keyword in keyword_index
+        }
+        self._keyword_regex = None
+        if keyword_index:
+            # 키워드 첫 글자가 아닌 위치는 문자 클래스 검사 한 번으로 건너뜁니다
+            first_chars = "".join(sorted({re.escape(keyword[0]) for keyword in keyword_index}))
+            self._keyword_regex = re.compile(f"(?=[{first_chars}])(?=(?P<_kw>{_trie_regex(keyword_index)}))")
+
+        # 첫 글자가 알려진 연속된 규칙들은 하나의 문자 클래스 검사로 먼저 걸러 대부분의 위치를 바로 건너뜁니다
+        parts = []
+        for chars, alternatives in runs:
+            if chars:
+                parts.append(f"(?=[{''.join(sorted(chars))}])(?:{'|'.join(alternatives)})")
+            else:
+                parts.extend(alternatives)
+        self._slot_groups = slot_groups
+        self._pattern_regex = re.compile(f"(?=(?:{'|'.join(parts)}))") if parts else None
+        self._first_pattern_index = min(slot_groups) if slot_groups else None
+
+    def add_rule(self, intent: str, pattern: str, priority: int = None):
+        """규칙을 추가하고 다시 컴파일합니다. priority 가 없으면 가장 낮은 우선순위로 추가됩니다."""
+        with self._lock:
+            if priority is None:
+                self._rules.append((intent, pattern))
+            else:
+                self._rules.insert(priority, (intent, pattern))
+            self._compile()
+
+    def load_rules(self, path: str):
+        """JSON 파일([{"intent": ..., "pattern": ..., "priority": ...}, ...])에서 규칙을 추가합니다."""
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+        with self._lock:
+            for rule in rules:
+                entry = (rule["intent"], rule["pattern"])
+                if rule.get("priority") is None:
+                    self._rules.append(entry)
+                else:
+                    self._rules.insert(rule["priority"], entry)
+            self._compile()
+
+    @property
+    def rule_count(self) -> int:
+        return len(self._rules)
+
+    def route(self, user_input: str) -> RouteResult:
+        """가장 우선순위가 높은(규칙 목록에서 가장 앞에 있는) 매칭 규칙의 intent 와 슬롯을 반환합니다."""
+        keyword_regex, pattern_regex = self._keyword_regex, self._pattern_regex
+        best = None
+        best_index = len(self._rules)
+
+        if keyword_regex is not None:
+            keyword_index = self._keyword_index
+            for match in keyword_regex.finditer(user_input):
+                index = keyword_index[match.group("_kw")]
+                if index < best_index:
+                    best_index = index
+
+        if pattern_regex is not None and self._first_pattern_index < best_index:
+            for match in pattern_regex.finditer(user_input):
+                index = int(match.lastgroup[2:])
+                if index < best_index:
+                    best, best_index = match, index
+                    if index == self._first_pattern_index:
+                        break
+
+        if best_index == len(self._rules):
+            return RouteResult(self.default_intent)
+
+        slots = {}
+        if best is not None:
+            for slot, group_name in self._slot_groups.get(best_index, ()):
+                value = best.group(group_name)
+                if value is not None:
+                    slots[slot] = value
+        return RouteResult(self._rules[best_index][0], slots, best_index)
+
+
+def _build_default_router() -> IntentRouter:
+    router = IntentRouter(DEFAULT_RULES)
+    rules_path = os.getenv('INTENT_RULES_PATH')
+    if rules_path:
+        router.load_rules(rules_path)
+    return router
+
+
+router = _build_default_router()
+
+
+def route_input(user_input: str) -> RouteResult:
+    """기본 라우터로 사용자 입력을 분류합니다."""
+    return router.route(user_input)
+
+
+def _benchmark(iterations: int = 20000):
+    """메시지당 라우팅 비용을 규칙 수별로 측정합니다."""
+    import timeit
+
+    messages = [
+        "2024년 7월에 얼마 썼어",
+        "오늘 kb 뉴스 알려줘",
+        "지난 달 소비 내역 알려줘",
+        "안녕 키키 오늘 기분 어때?",
+        "적금이랑 예금 중에 뭐가 좋을까? 조금 길게 설명해줄 수 있어? " * 4,
+    ]
+    for extra in (0, 100, 500):
+        # 절반은 키워드 규칙, 절반은 정규식 규칙 (첫 글자는 서로 다르게)
+        extra_rules = []
+        for i in range(extra):
+            head = chr(0xB000 + i * 7)
+            if i % 2:
+                extra_rules.append((f"extra-{i}", f"{head}키워드{i}"))
+            else:
+                extra_rules.append((f"extra-{i}", rf"{head}\s*규칙\s*{i}(번)?"))
+        bench_router = IntentRouter(DEFAULT_RULES + extra_rules)
+        for message in messages:
+            seconds = timeit.timeit(lambda: bench_router.route(message), number=iterations)
+            print(f"rules={bench_router.rule_count:4d}  {seconds / iterations * 1e6:8.2f} us/msg  "
+                  f"{bench_router.route(message).intent:15s} {message[:20]!r}")
+
+
+if __name__ == "__main__":
+    _benchmark()
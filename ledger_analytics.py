@@ -0,0 +1,376 @@
+from collections import OrderedDict
+from datetime import date, datetime
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from db import get_connection
+from expense_templates import RECORDS_TABLE, CATEGORY_TABLE, INCOME_CATEGORY_TYPE, EXPENSE_CATEGORY_TYPE
+from metrics import registry, timed
+from receipt_extractor import CATEGORY_NAMES, parse_amount
+
+# 워커마다 회원 장부를 메모리에 두므로 기본은 꺼져 있습니다
+ANALYTICS_ENABLED = os.getenv('ANALYTICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+ANALYTICS_CACHE_MEMBERS = int(os.getenv('ANALYTICS_CACHE_MEMBERS', '256'))
+# 조회마다 건수/최대 ID 로 변경 여부를 확인하지만, 금액 수정처럼 둘이 바뀌지 않는 변경을 위해 이 시간이 지나도 다시 읽습니다 (초)
+ANALYTICS_TTL = int(os.getenv('ANALYTICS_TTL', '300'))
+
+LOAD_LEDGER_SQL = f"""SELECT r.record_Id, r.amount, r.reg_date, r.category_Id, c.categoryType
+FROM {RECORDS_TABLE} r
+JOIN {CATEGORY_TABLE} c ON r.category_Id = c.category_Id
+WHERE r.member_Id = :member_Id
+  AND r.delYn = 0
+ORDER BY r.reg_date"""
+
+CATEGORY_TYPES_SQL = f"SELECT category_Id, categoryType FROM {CATEGORY_TABLE}"
+
+# 다른 워커/서비스가 기록을 추가·삭제했는지 확인하는 가벼운 조회 (회원별 건수와 최대 ID)
+# LOAD_LEDGER_SQL 과 같은 JOIN/조건이어야 카테고리가 없는 기록 때문에 매번 다시 읽지 않습니다
+LEDGER_VERSION_SQL = f"""SELECT COUNT(*), COALESCE(MAX(r.record_Id), 0)
+FROM {RECORDS_TABLE} r
+JOIN {CATEGORY_TABLE} c ON r.category_Id = c.category_Id
+WHERE r.member_Id = :member_Id
+  AND r.delYn = 0"""
+
+# 날짜를 알 수 없는 기록 (기간 조회에서는 빠지고 전체 합계에만 들어갑니다)
+UNKNOWN_DAY = -1
+
+
+def _to_day(reg_date) -> int:
+    """reg_date (문자열 또는 date/datetime) 를 날짜 서수(date.toordinal)로 변환합니다."""
+    if isinstance(reg_date, datetime):
+        return reg_date.date().toordinal()
+    if isinstance(reg_date, date):
+        return reg_date.toordinal()
+    try:
+        normalized = str(reg_date).strip()[:10].replace('.', '-').replace('/', '-')
+        return date.fromisoformat(normalized).toordinal()
+    except ValueError:
+        return UNKNOWN_DAY
+
+
+def _month_index(day: int) -> int:
+    if day == UNKNOWN_DAY:
+        return UNKNOWN_DAY
+    value = date.fromordinal(day)
+    return value.year * 12 + value.month - 1
+
+
+def _category_name(category_id: int) -> str:
+    names = CATEGORY_NAMES.get(str(category_id))
+    return names[0] if names else str(category_id)
+
+
+class MemberLedger:
+    """한 회원의 삭제되지 않은 기록을 컬럼별 NumPy 배열로 보관합니다 (용량을 두 배씩 늘리며 뒤에 추가).
+
+    행은 날짜순으로 유지해 기간 조건을 이진 탐색 슬라이스로 처리합니다. 날짜가 앞선 기록이 추가되면 다음 조회 때 다시 정렬합니다.
+    """
+
+    COLUMNS = (
+        ("record_id", np.int64),
+        ("amount", np.float64),
+        ("day", np.int32),
+        ("month", np.int32),
+        ("category_id", np.int32),
+        ("category_type", np.int8),
+    )
+
+    def __init__(self, capacity: int = 64):
+        self.size = 0
+        self.sorted = True
+        self.columns = {name: np.empty(capacity, dtype) for name, dtype in self.COLUMNS}
+        self.loaded_at = time.monotonic()
+        # LEDGER_VERSION_SQL 기준(카테고리가 있고 삭제되지 않은) 기록 수와 최대 record_Id (이 워커에서 추가/삭제하면 최대 ID 는 다음 확인 때 채웁니다)
+        self.db_count = 0
+        self.db_max_id = None
+
+    def matches_version(self, count: int, max_id: int) -> bool:
+        """DB 의 (건수, 최대 ID) 가 이 장부가 알고 있는 상태와 같은지 확인합니다."""
+        if count != self.db_count or (self.db_max_id is not None and max_id != self.db_max_id):
+            return False
+        self.db_max_id = max_id
+        return True
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, extra: int):
+        capacity = len(self.columns["amount"])
+        if self.size + extra <= capacity:
+            return
+        while capacity < self.size + extra:
+            capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+
+    def append(self, rows):
+        """(record_id, amount, reg_date, category_id, category_type) 행들을 추가합니다. record_id 를 모르면 -1."""
+        if not rows:
+            return
+        self._reserve(len(rows))
+        days = [_to_day(reg_date) for _, _, reg_date, _, _ in rows]
+        values = {
+            "record_id": [record_id for record_id, _, _, _, _ in rows],
+            "amount": [parse_amount(amount) for _, amount, _, _, _ in rows],
+            "day": days,
+            "month": [_month_index(day) for day in days],
+            "category_id": [int(category_id) for _, _, _, category_id, _ in rows],
+            "category_type": [int(category_type) for _, _, _, _, category_type in rows],
+        }
+        if days != sorted(days) or (self.size and days[0] < self.columns["day"][self.size - 1]):
+            self.sorted = False
+        end = self.size + len(rows)
+        for name, column in self.columns.items():
+            column[self.size:end] = values[name]
+        self.size = end
+
+    def _ensure_sorted(self):
+        if self.sorted:
+            return
+        order = np.argsort(self.columns["day"][:self.size], kind="stable")
+        for column in self.columns.values():
+            column[:self.size] = column[:self.size][order]
+        self.sorted = True
+
+    def remove(self, record_id: int) -> bool:
+        """record_id 의 기록을 지웁니다. 찾지 못하면 False."""
+        keep = self.columns["record_id"][:self.size] != record_id
+        removed = self.size - int(keep.sum())
+        if not removed:
+            return False
+        for name, column in self.columns.items():
+            kept = column[:self.size][keep]
+            column[:len(kept)] = kept
+        self.size -= removed
+        return True
+
+    def _view(self, names, start: date = None, end: date = None, category_type: int = None):
+        """[start, end) 기간과 categoryType 조건에 맞는 행의 names 컬럼을 반환합니다 (기간은 복사 없는 슬라이스)."""
+        self._ensure_sorted()
+        days = self.columns["day"][:self.size]
+        low = int(np.searchsorted(days, start.toordinal(), "left")) if start is not None else 0
+        high = int(np.searchsorted(days, end.toordinal(), "left")) if end is not None else self.size
+        columns = [self.columns[name][low:high] for name in names]
+        if category_type is None:
+            return columns
+        mask = self.columns["category_type"][low:high] == category_type
+        return [column[mask] for column in columns]
+
+    def type_totals(self, start: date = None, end: date = None) -> dict:
+        """categoryType 별 (합계, 건수)"""
+        types, amounts = self._view(("category_type", "amount"), start, end)
+        types = types.astype(np.intp)
+        sums = np.bincount(types, weights=amounts, minlength=3)
+        counts = np.bincount(types, minlength=3)
+        return {int(t): (float(sums[t]), int(counts[t])) for t in np.nonzero(counts)[0]}
+
+    def category_totals(self, start: date = None, end: date = None, category_type: int = None) -> list:
+        """카테고리별 (category_id, 합계, 건수) - 합계가 큰 순"""
+        category_ids, amounts = self._view(("category_id", "amount"), start, end, category_type)
+        # category_Id 는 작은 양의 정수라 정렬 없이 bincount 로 묶습니다
+        sums = np.bincount(category_ids, weights=amounts)
+        counts = np.bincount(category_ids)
+        present = np.nonzero(counts)[0]
+        order = present[np.argsort(-sums[present], kind="stable")]
+        return [(int(i), float(sums[i]), int(counts[i])) for i in order]
+
+    def monthly_totals(self, start: date = None, end: date = None, category_type: int = None) -> list:
+        """월별 ('YYYY-MM', 합계, 건수) - 월 순"""
+        months, amounts = self._view(("month", "amount"), start, end, category_type)
+        known = months != UNKNOWN_DAY
+        months, amounts = months[known], amounts[known]
+        if not len(months):
+            return []
+        # 행이 날짜순이라 같은 달은 붙어 있으므로 경계만 찾아 구간 합을 구합니다
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(months)) + 1))
+        sums = np.add.reduceat(amounts, starts)
+        counts = np.diff(np.append(starts, len(months)))
+        return [(f"{int(m) // 12:04d}-{int(m) % 12 + 1:02d}", float(total), int(count))
+                for m, total, count in zip(months[starts], sums, counts)]
+
+
+class LedgerCache:
+    """회원별 MemberLedger 를 LRU 로 보관합니다. 저장/삭제 시 캐시에 있는 회원만 그 자리에서 갱신합니다."""
+
+    def __init__(self, max_members: int = ANALYTICS_CACHE_MEMBERS, ttl_seconds: int = ANALYTICS_TTL):
+        self.max_members = max_members
+        self.ttl_seconds = ttl_seconds
+        self._ledgers = OrderedDict()
+        self._category_types = None
+        self._lock = threading.RLock()
+        # 이 워커에서 반영한 저장/삭제 횟수 (장부를 읽는 동안 바뀌었으면 읽은 장부를 캐시에 넣지 않습니다)
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _load_category_types(self) -> dict:
+        with get_connection() as connection:
+            rows = connection.execute(text(CATEGORY_TYPES_SQL)).fetchall()
+        return {int(category_id): int(category_type) for category_id, category_type in rows}
+
+    def _category_type(self, category_id) -> int:
+        category_id = int(category_id)
+        if self._category_types is None or category_id not in self._category_types:
+            self._category_types = self._load_category_types()
+        return self._category_types.get(category_id)
+
+    def _load_version(self, connection, member_id: int):
+        count, max_id = connection.execute(text(LEDGER_VERSION_SQL), {"member_Id": member_id}).one()
+        return int(count), int(max_id)
+
+    def _load(self, member_id: int) -> MemberLedger:
+        with timed("analytics_load"), get_connection() as connection:
+            count, max_id = self._load_version(connection, member_id)
+            rows = connection.execute(text(LOAD_LEDGER_SQL), {"member_Id": member_id}).fetchall()
+        ledger = MemberLedger(capacity=max(64, len(rows)))
+        ledger.append([tuple(row) for row in rows])
+        ledger.db_count, ledger.db_max_id = count, max_id
+        return ledger
+
+    def get(self, member_id: int) -> MemberLedger:
+        """회원의 장부를 반환합니다. 없거나, DB 의 건수/최대 ID 가 달라졌거나, TTL 이 지났으면 DB 에서 읽습니다."""
+        with self._lock:
+            ledger = self._ledgers.get(member_id)
+        if ledger is not None and time.monotonic() - ledger.loaded_at < self.ttl_seconds:
+            with timed("analytics_version"), get_connection() as connection:
+                version = self._load_version(connection, member_id)
+            with self._lock:
+                if self._ledgers.get(member_id) is ledger and ledger.matches_version(*version):
+                    self._ledgers.move_to_end(member_id)
+                    self.hits += 1
+                    return ledger
+                self.stale += 1
+        with self._lock:
+            self.misses += 1
+            writes = self._writes
+
+        # DB 읽기는 잠금 밖에서 합니다
+        ledger = self._load(member_id)
+        with self._lock:
+            # 읽는 동안 이 워커에서 저장/삭제가 있었으면 그 기록이 이미 포함됐을 수 있어 캐시에 넣지 않습니다
+            if self._writes == writes:
+                self._ledgers[member_id] = ledger
+                self._ledgers.move_to_end(member_id)
+                while len(self._ledgers) > self.max_members:
+                    self._ledgers.popitem(last=False)
+        return ledger
+
+    def query(self, member_id: int, compute):
+        """회원 장부로 compute(ledger) 를 계산합니다 (저장/삭제 반영과 겹치지 않도록 잠금 안에서)."""
+        ledger = self.get(member_id)
+        with self._lock:
+            return compute(ledger)
+
+    def append_records(self, records):
+        """새로 저장된 기록(records.RECORD_COLUMNS dict)을 캐시에 있는 회원 장부 뒤에 추가합니다. 커밋 후에 호출합니다."""
+        with self._lock:
+            self._writes += 1
+            for record in records:
+                if int(record.get("delYn") or 0):
+                    continue
+                member_id = int(record["member_Id"])
+                ledger = self._ledgers.get(member_id)
+                if ledger is None:
+                    continue
+                category_type = self._category_type(record["category_Id"])
+                if category_type is None:
+                    # 모르는 카테고리는 DB 조인 결과와 맞추기 위해 다음 조회 때 다시 읽습니다
+                    self._ledgers.pop(member_id, None)
+                    continue
+                ledger.append([(-1, record["amount"], record["reg_date"], record["category_Id"], category_type)])
+                ledger.db_count += 1
+                ledger.db_max_id = None
+
+    def remove_record(self, member_id: int, record_id: int):
+        """삭제된 기록을 장부에서 뺍니다. 찾지 못하면(저장 후 ID 를 모르는 기록) 장부를 버립니다."""
+        with self._lock:
+            self._writes += 1
+            ledger = self._ledgers.get(int(member_id))
+            if ledger is None:
+                return
+            if ledger.remove(int(record_id)):
+                ledger.db_count -= 1
+                ledger.db_max_id = None
+            else:
+                self._ledgers.pop(int(member_id), None)
+
+    def invalidate(self, member_id: int = None):
+        with self._lock:
+            if member_id is None:
+                self._ledgers.clear()
+            else:
+                self._ledgers.pop(int(member_id), None)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "members": len(self._ledgers),
+                "records": sum(len(ledger) for ledger in self._ledgers.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+ledger_cache = LedgerCache()
+
+
+def _format_amount(value: float):
+    return int(value) if float(value).is_integer() else round(value, 2)
+
+
+def _period_answer(ledger: MemberLedger, start: date, end: date) -> str:
+    total, count = ledger.type_totals(start, end).get(EXPENSE_CATEGORY_TYPE, (0.0, 0))
+    lines = [f"expense_count={count}, total_expense={_format_amount(total)}"]
+    categories = ledger.category_totals(start, end, EXPENSE_CATEGORY_TYPE)
+    if categories:
+        lines.append("카테고리별 지출: " + ", ".join(
+            f"{_category_name(category_id)}={_format_amount(amount)}({n}건)" for category_id, amount, n in categories))
+    return "\n".join(lines)
+
+
+def _net_assets_answer(ledger: MemberLedger) -> str:
+    totals = ledger.type_totals()
+    income = totals.get(INCOME_CATEGORY_TYPE, (0.0, 0))[0]
+    expense = totals.get(EXPENSE_CATEGORY_TYPE, (0.0, 0))[0]
+    lines = [f"total_income={_format_amount(income)}, total_expense={_format_amount(expense)}, "
+             f"net_assets={_format_amount(income - expense)}"]
+    months = ledger.monthly_totals(category_type=EXPENSE_CATEGORY_TYPE)[-3:]
+    if months:
+        lines.append("최근 월별 지출: " + ", ".join(f"{ym}={_format_amount(amount)}" for ym, amount, _ in months))
+    return "\n".join(lines)
+
+
+def answer_template(template_query, member_id: int):
+    """템플릿 질문을 회원 장부의 벡터 연산으로 계산해 자연어 단계에 넣을 결과 문자열을 반환합니다.
+
+    지원하지 않는 템플릿(최근 기록처럼 메모가 필요한 경우)이거나 분석 엔진이 꺼져 있으면 None 을 반환합니다.
+    """
+    if not ANALYTICS_ENABLED or member_id is None:
+        return None
+
+    params = template_query.params
+    if template_query.name.endswith("_expense") and "start_date" in params:
+        start, end = date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"])
+        answer = lambda ledger: _period_answer(ledger, start, end)
+    elif template_query.name == "total_expense":
+        answer = lambda ledger: _period_answer(ledger, None, None)
+    elif template_query.name == "net_assets":
+        answer = _net_assets_answer
+    else:
+        return None
+
+    with timed("analytics_query"):
+        result = ledger_cache.query(int(member_id), answer)
+    registry.inc("analytics_answers_total", 1, {"template": template_query.name},
+                 "분석 엔진으로 답한 템플릿 질문 수")
+    return result
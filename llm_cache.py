@@ -0,0 +1,164 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from metrics import registry
+
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(os.path.dirname(__file__), '.cache', 'llm_cache.sqlite3'))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+# 캐시를 쓸 호출 지점 (쉼표 구분) - 이 중에서도 temperature 가 LLM_CACHE_MAX_TEMPERATURE 이하인 호출만 캐시합니다
+LLM_CACHE_SITES = {site.strip() for site in os.getenv(
+    'LLM_CACHE_SITES', 'sql_generation,receipt_parse,news_summary').split(',') if site.strip()}
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv('LLM_CACHE_MAX_TEMPERATURE', '0.2'))
+
+CREATE_TABLE_SQL = """CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+)"""
+
+
+class SQLiteLLMCache(BaseCache):
+    """여러 워커 프로세스가 함께 쓰는 SQLite 기반 LLM 응답 캐시.
+
+    키는 모델/파라미터(llm_string)와 프롬프트의 해시이며, 전체 크기가 max_bytes 를 넘으면 오래 안 쓴 항목부터 지웁니다.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES, call_site: str = "default"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.call_site = call_site
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # fork 전(gunicorn --preload)에 만들어질 수 있으므로 테이블만 만들고 연결은 남겨두지 않습니다
+        connection = self._open()
+        try:
+            connection.execute(CREATE_TABLE_SQL)
+            connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at)")
+        finally:
+            connection.close()
+
+    def _open(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _connect(self) -> sqlite3.Connection:
+        """프로세스·스레드마다 하나의 연결을 사용합니다 (WAL 모드로 프로세스 간 동시 읽기 허용).
+
+        SQLite 연결은 fork 를 넘어 쓸 수 없으므로, 부모 프로세스에서 물려받은 연결은 닫지 않고 버린 뒤 새로 엽니다.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._open()
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _count(self, result: str):
+        if result == "hit":
+            self.hits += 1
+        elif result == "miss":
+            self.misses += 1
+        registry.inc("llm_cache_requests_total", 1, {"call_site": self.call_site, "result": result},
+                     "LLM 응답 캐시 조회 수 (hit/miss)")
+
+    def lookup(self, prompt: str, llm_string: str):
+        key = self._key(prompt, llm_string)
+        try:
+            connection = self._connect()
+            row = connection.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("miss")
+                return None
+            connection.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._count("hit")
+            return [loads(generation) for generation in json.loads(row[0])]
+        except Exception as e:
+            print(f"LLM 캐시 조회 중 오류 발생: {e}")
+            self._count("error")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val):
+        value = json.dumps([dumps(generation) for generation in return_val], ensure_ascii=False)
+        try:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (self._key(prompt, llm_string), value, len(value.encode("utf-8")), time.time()),
+            )
+            self._evict(connection)
+        except Exception as e:
+            print(f"LLM 캐시 저장 중 오류 발생: {e}")
+
+    def _evict(self, connection: sqlite3.Connection):
+        """전체 크기가 max_bytes 를 넘으면 90% 이하가 될 때까지 오래 안 쓴 항목을 지웁니다."""
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = connection.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+        connection.executemany("DELETE FROM llm_cache WHERE key = ?", evicted)
+        registry.inc("llm_cache_evictions_total", len(evicted), help_text="LLM 응답 캐시에서 지운 항목 수")
+
+    def clear(self, **kwargs):
+        self._connect().execute("DELETE FROM llm_cache")
+
+    def get_stats(self) -> dict:
+        entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_llm_cache(call_site: str, temperature: float):
+    """호출 지점에 캐시를 쓸 수 있으면 캐시를, 아니면 None 을 반환합니다 (ChatOpenAI(cache=...) 에 전달)."""
+    if not LLM_CACHE_ENABLED or call_site not in LLM_CACHE_SITES or temperature > LLM_CACHE_MAX_TEMPERATURE:
+        return None
+    cache = _caches.get(call_site)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(call_site)
+            if cache is None:
+                cache = _caches[call_site] = SQLiteLLMCache(call_site=call_site)
+    return cache
+
+
+def get_llm_cache_stats() -> dict:
+    """이 워커에서 쓰인 호출 지점별 캐시 통계 (항목 수/크기는 워커가 공유하는 파일 기준)"""
+    return {
+        "enabled": LLM_CACHE_ENABLED,
+        "path": LLM_CACHE_PATH,
+        "call_sites": {call_site: cache.get_stats() for call_site, cache in list(_caches.items())},
+    }
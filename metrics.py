@@ -0,0 +1,211 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import lru_cache, wraps
+import bisect
+import threading
+import time
+
+# 초 단위 히스토그램 버킷 (Prometheus 기본값 + LLM 호출용 긴 구간)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_PREFIX = "pennybuddy"
+
+# 현재 요청에서 측정된 단계별 시간 (구조화 로그용)
+_request_timings = ContextVar("request_timings", default=None)
+# 작업 스레드들이 같은 요청의 기록을 동시에 갱신할 수 있으므로 잠금으로 보호합니다
+_request_timings_lock = threading.Lock()
+
+
+class Histogram:
+    """고정 버킷 히스토그램"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """단계별 지연 히스토그램과 카운터를 보관하고 Prometheus 텍스트 형식으로 내보냅니다."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+
+    def _key(self, name, labels):
+        return name, tuple(sorted((labels or {}).items()))
+
+    def observe(self, name: str, value: float, labels: dict = None, help_text: str = ""):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+                self._help.setdefault(name, ("histogram", help_text))
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, labels: dict = None, help_text: str = ""):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._help.setdefault(name, ("counter", help_text))
+
+    def set(self, name: str, value: float, labels: dict = None, help_text: str = ""):
+        key = self._key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+            self._help.setdefault(name, ("gauge", help_text))
+
+    @staticmethod
+    def _format_labels(labels, extra=()) -> str:
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        escaped = (
+            f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+            for key, value in items
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> str:
+        """Prometheus exposition 형식 텍스트를 만듭니다."""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            help_items = dict(self._help)
+
+        lines = []
+        for name, (metric_type, help_text) in sorted(help_items.items()):
+            full_name = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# HELP {full_name} {help_text or name}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            if metric_type == "histogram":
+                for (metric, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(buckets, counts):
+                        cumulative += bucket_count
+                        lines.append(f"{full_name}_bucket{self._format_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{full_name}_bucket{self._format_labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{full_name}_sum{self._format_labels(labels)} {total}")
+                    lines.append(f"{full_name}_count{self._format_labels(labels)} {count}")
+            else:
+                values = counters if metric_type == "counter" else gauges
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{full_name}{self._format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def observe_stage(stage: str, seconds: float):
+    """단계 소요 시간을 기록합니다."""
+    registry.observe("stage_duration_seconds", seconds, {"stage": stage}, "처리 단계별 소요 시간(초)")
+    timings = _request_timings.get()
+    if timings is not None:
+        with _request_timings_lock:
+            timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 2)
+
+
+@contextmanager
+def timed(stage: str):
+    """with timed("ocr_upload"): ... 형태로 단계 시간을 측정합니다 (예외가 나도 기록)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def timed_stage(stage: str):
+    """함수 전체를 한 단계로 측정하는 데코레이터"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_tokens(call_site: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+    """LLM 호출 지점별 토큰 사용량을 기록합니다."""
+    for kind, value in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        if value:
+            registry.inc("llm_tokens_total", value, {"call_site": call_site, "kind": kind}, "LLM 호출 지점별 토큰 수")
+
+
+def set_gauge(name: str, value: float, labels: dict = None, help_text: str = ""):
+    registry.set(name, value, labels, help_text)
+
+
+@lru_cache(maxsize=None)
+def _token_usage_handler_class():
+    # langchain_core 는 LLM 을 처음 호출할 때 import 합니다 (app 콜드 스타트 비용 절감)
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsageHandler(BaseCallbackHandler):
+        """LLM 호출이 끝나면 응답의 토큰 사용량을 기록하는 콜백"""
+
+        def __init__(self, call_site: str):
+            self.call_site = call_site
+
+        def on_llm_end(self, response, **kwargs):
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            if not usage:
+                for generations in response.generations:
+                    for generation in generations:
+                        metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                        prompt_tokens += metadata.get("input_tokens", 0)
+                        completion_tokens += metadata.get("output_tokens", 0)
+            record_tokens(self.call_site, prompt_tokens, completion_tokens)
+
+    return TokenUsageHandler
+
+
+def token_config(call_site: str) -> dict:
+    """chain.invoke(..., config=token_config("sql_generation")) 으로 토큰 사용량을 기록합니다."""
+    return {"callbacks": [_token_usage_handler_class()(call_site)]}
+
+
+def start_request_timings() -> dict:
+    """현재 요청의 단계별 시간 기록을 시작합니다."""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def in_request_context(func):
+    """executor.submit/map 에 넘길 함수를 감싸, 작업 스레드에서도 현재 요청의 단계별 시간 기록에 쌓이게 합니다."""
+    context = copy_context()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # 같은 Context 는 여러 스레드에서 동시에 들어갈 수 없으므로 호출마다 복사합니다 (기록 dict 는 공유)
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def record_request(endpoint: str, status: int, seconds: float):
+    registry.observe("request_duration_seconds", seconds, {"endpoint": endpoint},
+                     "엔드포인트별 응답 완료(스트리밍 본문 포함)까지의 시간(초)")
+    registry.inc("requests_total", 1, {"endpoint": endpoint, "status": status}, "엔드포인트별 요청 수")
+
+
+def render_metrics() -> str:
+    return registry.render()
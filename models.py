@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel, Field
 
 class Topic(BaseModel):
@@ -11,3 +13,19 @@ class Topic(BaseModel):
     record_memo: str = Field(description="메모 제목을 요약해서 적어줘")
     record_details: str = Field(description="영수증을 보고 이 영수증을 받은 사람이 뭘 했는지 추론해서 적어줘")
     delYn: int = 0
+
+class ReceiptNote(BaseModel):
+    """금액/날짜를 규칙으로 추출한 뒤 LLM 에게 요청하는 자유 텍스트 필드"""
+    category_Id: str = Field(
+        description="적합한 카테고리를 골라줘 가능한 카테고리 :  소득, 저축 출금, 차입, 세금 · 공과금, 식비, 주거, 피복, 보건위생, 교육, 여가 활동, 교통, 통신, 효도, 기타, 특비, 저축, 차입금 상환"
+    )
+    record_memo: str = Field(description="메모 제목을 요약해서 적어줘")
+    record_details: str = Field(description="영수증을 보고 이 영수증을 받은 사람이 뭘 했는지 추론해서 적어줘")
+
+class BatchTopic(Topic):
+    """여러 영수증을 한 번에 파싱할 때 각 결과가 몇 번째 영수증인지 표시"""
+    receipt_index: int = Field(description="입력에서 [영수증 N] 으로 표시된 영수증 번호 N")
+
+class TopicBatch(BaseModel):
+    """여러 영수증의 파싱 결과 목록"""
+    receipts: List[BatchTopic] = Field(description="입력된 모든 영수증의 파싱 결과 (영수증마다 하나씩)")
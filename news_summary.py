@@ -1,71 +1,270 @@
 import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup as bs
 from dotenv import load_dotenv
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.chains.combine_documents.stuff import StuffDocumentsChain
-from langchain.chains.llm import LLMChain
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import ChatOpenAI
 import os
 
+from llm_cache import get_llm_cache
+from metrics import in_request_context, timed_stage, token_config
+
 dotenv_path = os.path.join(os.path.dirname(__file__), 'env/.env')
 load_dotenv(dotenv_path=dotenv_path)
 
-# 환경변수에서 API 키를 불러옵니다
-llm = ChatOpenAI(
-    api_key=os.getenv('OPENAI_API_KEY'),
-    temperature=1.0,
-    max_tokens=2048,
-    model_name="gpt-4o-mini"
-)
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """요약용 ChatOpenAI 를 처음 쓸 때 만들어 공유합니다"""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                # 환경변수에서 API 키를 불러옵니다
+                _llm = ChatOpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'),
+                    temperature=NEWS_SUMMARY_TEMPERATURE,
+                    max_tokens=2048,
+                    model_name="gpt-4o-mini",
+                    cache=get_llm_cache("news_summary", NEWS_SUMMARY_TEMPERATURE),
+                )
+    return _llm
+
+SEARCH_URL = os.getenv('NEWS_SEARCH_URL', "https://search.naver.com/search.naver?where=news&ie=utf8&sm=nws_hty&query=kb")
+NEWS_TOP_N = int(os.getenv('NEWS_TOP_N', '5'))
+NEWS_SUMMARY_TTL = int(os.getenv('NEWS_SUMMARY_TTL', '3600'))
+NEWS_REFRESH_INTERVAL = int(os.getenv('NEWS_REFRESH_INTERVAL', '600'))
+# 워밍업을 하지 않아도 첫 요약 요청 때 백그라운드 갱신을 시작합니다
+NEWS_REFRESH_ENABLED = os.getenv('NEWS_REFRESH_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+NEWS_SUMMARY_CONCURRENCY = int(os.getenv('NEWS_SUMMARY_CONCURRENCY', '3'))
+# 같은 기사는 워커 사이에서 요약을 재사용할 수 있도록 낮게 둡니다 (LLM_CACHE_MAX_TEMPERATURE 이하일 때만 캐시)
+NEWS_SUMMARY_TEMPERATURE = float(os.getenv('NEWS_SUMMARY_TEMPERATURE', '0.2'))
+# 요약에 넣을 본문 최대 길이 (한글은 대략 한 글자에 한 토큰) 와, 이보다 길면 나눠서 요약(map) 후 합치는(reduce) 조각 크기
+NEWS_MAX_INPUT_CHARS = int(os.getenv('NEWS_MAX_INPUT_CHARS', '8000'))
+NEWS_CHUNK_CHARS = int(os.getenv('NEWS_CHUNK_CHARS', '3000'))
+NEWS_MAP_CONCURRENCY = int(os.getenv('NEWS_MAP_CONCURRENCY', '4'))
+NEWS_FETCH_TIMEOUT = float(os.getenv('NEWS_FETCH_TIMEOUT', '10'))
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# 본문이 들어있는 요소 (네이버 뉴스 → 일반 기사 페이지 순서로 시도)
+ARTICLE_SELECTORS = ("#dic_area", "#newsct_article", "#articleBodyContents", "#articleBody",
+                     "[itemprop='articleBody']", "article")
+# 본문이 아닌 요소 (메뉴, 광고, 댓글 등)
+NOISE_TAGS = ("script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe", "button", "figure")
+
+SUMMARY_PROMPT = PromptTemplate.from_template("""당신은 시사 상식 전문가입니다. 내용을 말투는 캐주얼한 톤앤 매너(존댓말)와 이모티콘을 추가해서 시사 상식을 잘 모르는 사람도 알 수 있게 쉬운 설명으로 3줄로 말해주세요:
+    "{text}"
+   """)
+
+MAP_PROMPT = PromptTemplate.from_template("""다음은 뉴스 기사의 일부입니다. 사실 관계(누가, 무엇을, 수치, 이유)를 빠뜨리지 말고 핵심만 3~5문장으로 요약하세요:
+    "{text}"
+   """)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """검색 페이지와 기사 페이지를 가져올 때 커넥션을 재사용하는 세션을 공유합니다."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=frozenset(['GET']))
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, NEWS_SUMMARY_CONCURRENCY * 2),
+                                      max_retries=retry)
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def fetch_html(url) -> str:
+    """페이지를 연결/읽기 시간 제한을 두고 가져옵니다."""
+    response = get_session().get(url, timeout=(3.05, NEWS_FETCH_TIMEOUT))
+    response.raise_for_status()
+    # charset 이 없으면 requests 가 ISO-8859-1 로 가정하므로 본문에서 추정합니다
+    if 'charset' not in response.headers.get('Content-Type', '').lower():
+        response.encoding = response.apparent_encoding
+    return response.text
+
+
+def extract_main_text(html) -> str:
+    """기사 페이지에서 메뉴/광고/댓글을 빼고 본문 텍스트만 추출합니다."""
+    soup = bs(html, "html.parser")
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+
+    for selector in ARTICLE_SELECTORS:
+        element = soup.select_one(selector)
+        if element is not None:
+            text = element.get_text("\n", strip=True)
+            if len(text) >= 200:
+                break
+    else:
+        # 알려진 본문 요소가 없으면 충분히 긴 문단만 모읍니다
+        paragraphs = [p.get_text(" ", strip=True) for p in soup.find_all("p")]
+        text = "\n".join(p for p in paragraphs if len(p) >= 40) or soup.get_text("\n", strip=True)
+
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+@timed_stage("news_scrape")
+def get_article_links(search_url, limit):
+    """뉴스 검색 결과 페이지에서 상위 limit 개 기사의 링크를 가져옵니다"""
+    soup = bs(fetch_html(search_url), "html.parser")
+    elements = soup.select(".news_tit")
+    return [element.get('href') for element in elements[:limit] if element.get('href')]
 
 def get_article_link(search_url, n):
     """뉴스 검색 결과 페이지에서 n번째 기사의 링크를 가져옵니다"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    page = requests.get(search_url, headers=headers)
-    soup = bs(page.text, "html.parser")
-    elements = soup.select(".news_tit")
-    if n < 1 or n > len(elements):
+    links = get_article_links(search_url, n)
+    if n < 1 or n > len(links):
         raise ValueError("주어진 n 값이 유효하지 않습니다.")
-    article_element = elements[n - 1]
-    article_url = article_element.get('href')
-    return article_url
+    return links[n - 1]
 
+@timed_stage("news_summarization")
 def summarize_url(url):
-    """주어진 URL의 내용을 요약합니다"""
-    loader = WebBaseLoader(url)
-    text = loader.load_and_split()
-    load_content = text[0].page_content
-
-    text_splitter = CharacterTextSplitter(
-        separator="\n",
-        chunk_size=1000,
+    """주어진 URL의 본문을 요약합니다. 본문이 길면 조각별로 병렬 요약한 뒤 합쳐서 요약합니다."""
+    text = extract_main_text(fetch_html(url))[:NEWS_MAX_INPUT_CHARS]
+    if not text:
+        raise ValueError("기사 본문을 찾을 수 없습니다.")
+
+    config = token_config("news_summary")
+    summary_chain = SUMMARY_PROMPT | get_llm() | StrOutputParser()
+    if len(text) <= NEWS_CHUNK_CHARS:
+        return summary_chain.invoke({"text": text}, config=config)
+
+    text_splitter = RecursiveCharacterTextSplitter(
+        separators=["\n", ". ", " "],
+        chunk_size=NEWS_CHUNK_CHARS,
         chunk_overlap=200,
         length_function=len,
-        is_separator_regex=False,
     )
-    texts = text_splitter.create_documents([load_content])
+    chunks = text_splitter.split_text(text)
+    map_chain = MAP_PROMPT | get_llm() | StrOutputParser()
+    partial_summaries = map_chain.batch([{"text": chunk} for chunk in chunks],
+                                        config={**config, "max_concurrency": NEWS_MAP_CONCURRENCY})
+    return summary_chain.invoke({"text": "\n\n".join(partial_summaries)}, config=config)
+
+class NewsSummaryStore:
+    """기사 URL 별 요약을 TTL 동안 보관하고, 백그라운드에서 주기적으로 채우는 저장소"""
+
+    def __init__(self, ttl_seconds: int = NEWS_SUMMARY_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._summaries = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _fresh_items(self):
+        now = time.monotonic()
+        with self._lock:
+            return [(url, summary) for url, (summary, created_at) in self._summaries.items()
+                    if now - created_at < self.ttl_seconds]
+
+    def has(self, url) -> bool:
+        return any(fresh_url == url for fresh_url, _ in self._fresh_items())
+
+    def put(self, url, summary):
+        with self._lock:
+            self._summaries[url] = (summary, time.monotonic())
+
+    def random_item(self, min_items: int = 1):
+        """저장된 요약 중 하나를 무작위로 반환합니다. 만료되지 않은 요약이 min_items 개보다 적으면 None."""
+        items = self._fresh_items()
+        return random.choice(items) if len(items) >= max(1, min_items) else None
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            for url in [url for url, (_, created_at) in self._summaries.items()
+                        if now - created_at >= self.ttl_seconds]:
+                del self._summaries[url]
+
+    def refresh(self, search_url=SEARCH_URL, top_n=NEWS_TOP_N) -> int:
+        """검색 페이지를 한 번 가져와 새 기사만 병렬로 요약합니다. 새로 요약한 기사 수를 반환합니다."""
+        with self._refresh_lock:
+            self._evict_expired()
+            new_urls = [url for url in get_article_links(search_url, top_n) if not self.has(url)]
+            if not new_urls:
+                return 0
+
+            def summarize_and_store(url):
+                try:
+                    self.put(url, summarize_url(url))
+                    return True
+                except Exception as e:
+                    print(f"뉴스 요약 중 오류 발생 ({url}): {e}")
+                    return False
+
+            with ThreadPoolExecutor(max_workers=NEWS_SUMMARY_CONCURRENCY) as executor:
+                return sum(executor.map(in_request_context(summarize_and_store), new_urls))
+
+    def _run(self, interval_seconds):
+        while not self._stop.is_set():
+            try:
+                print(f"뉴스 요약 갱신: {self.refresh()}건")
+            except Exception as e:
+                print(f"뉴스 요약 갱신 중 오류 발생: {e}")
+            self._stop.wait(interval_seconds)
+
+    def start(self, interval_seconds: int = NEWS_REFRESH_INTERVAL):
+        """백그라운드 갱신 스레드를 시작합니다 (이미 실행 중이면 무시)."""
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval_seconds,),
+                                            name="news-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+news_store = NewsSummaryStore()
+
+
+def start_news_refresher():
+    """뉴스 요약 백그라운드 갱신을 시작합니다."""
+    news_store.start()
 
-    prompt_template = """당신은 시사 상식 전문가입니다. 내용을 말투는 캐주얼한 톤앤 매너(존댓말)와 이모티콘을 추가해서 시사 상식을 잘 모르는 사람도 알 수 있게 쉬운 설명으로 3줄로 말해주세요:
-    "{text}"
-   """
-    prompt = PromptTemplate.from_template(prompt_template)
-    llm_chain = LLMChain(llm=llm, prompt=prompt)
-    stuff_chain = StuffDocumentsChain(llm_chain=llm_chain, document_variable_name="text")
-    summary = stuff_chain.run(texts)
-    return summary
 
 def summarize_news():
-    """뉴스 기사 링크를 요약합니다"""
-    search_url = "https://search.naver.com/search.naver?where=news&ie=utf8&sm=nws_hty&query=kb"
-    n = random.randint(1, 5)  # 1~5 사이의 정수
+    """뉴스 기사 링크를 요약합니다 (상위 기사들이 미리 요약되어 있으면 그중 하나를 바로 반환)"""
+    if NEWS_REFRESH_ENABLED:
+        news_store.start()
+
+    # 상위 NEWS_TOP_N 개가 모두 채워지기 전에는 저장된 한두 기사만 반복되지 않도록 바로 요약합니다
+    cached = news_store.random_item(min_items=NEWS_TOP_N)
+    if cached is not None:
+        article_url, summary = cached
+        return {"url": article_url, "response": summary}
+
+    # 아직 갱신 전이면 기존처럼 무작위 기사를 바로 요약하고 저장소에 넣어둡니다
+    n = random.randint(1, NEWS_TOP_N)  # 1~5 사이의 정수
     try:
-        article_url = get_article_link(search_url, n)
+        article_url = get_article_link(SEARCH_URL, n)
         summary = summarize_url(article_url)
+        news_store.put(article_url, summary)
         print(summary)
         return {"url": article_url, "response": summary}
     except ValueError as e:
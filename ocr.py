@@ -1,37 +1,149 @@
 import json
+import os
+import threading
 import requests
 import uuid
 import time
 
-def ocr_with_clova(image_path: str, secret_key: str, api_url: str) -> str:
-    """Clova OCR API를 사용하여 이미지에서 텍스트 추출"""
-    try:
+import cv2
+import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import timed
+
+# 파일 시그니처로 실제 이미지 포맷 판별 (Clova OCR 지원 포맷)
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'%PDF', 'pdf'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+]
+
+
+def detect_image_format(data: bytes, default: str = 'jpg') -> str:
+    """이미지 바이트의 시그니처를 보고 포맷을 반환합니다."""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return image_format
+    return default
+
+
+class ClovaOCRClient:
+    """커넥션을 재사용하는 Clova OCR 클라이언트 (타임아웃/재시도/업로드 전 이미지 축소 포함)"""
+
+    def __init__(self, secret_key: str, api_url: str,
+                 connect_timeout: float = 3.05, read_timeout: float = 30.0,
+                 max_retries: int = 2, max_side: int = 1600, jpeg_quality: int = 85,
+                 pool_maxsize: int = 10):
+        self.secret_key = secret_key
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['POST']),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'X-OCR-SECRET': secret_key})
+
+    @staticmethod
+    def _read_image(image) -> bytes:
+        """bytes, 파일 객체(read 지원), 파일 경로 중 무엇이든 바이트로 읽습니다."""
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return bytes(image)
+        if hasattr(image, 'read'):
+            return image.read()
+        with open(image, 'rb') as f:
+            return f.read()
+
+    def prepare_image(self, data: bytes):
+        """큰 사진은 max_side 에 맞춰 줄이고 JPEG 으로 다시 인코딩합니다. (바이트, 포맷)을 반환합니다."""
+        image_format = detect_image_format(data)
+        if image_format not in ('jpg', 'png') or not self.max_side:
+            return data, image_format
+
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return data, image_format
+
+        height, width = image.shape[:2]
+        scale = self.max_side / max(height, width)
+        if scale >= 1:
+            return data, image_format
+
+        resized = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok or len(encoded) >= len(data):
+            return data, image_format
+        return encoded.tobytes(), 'jpg'
+
+    def extract_text(self, image) -> str:
+        """이미지에서 텍스트를 추출합니다."""
+        with timed("ocr_image_prepare"):
+            data, image_format = self.prepare_image(self._read_image(image))
+
         request_json = {
-            'images': [{'format': 'png', 'name': 'demo'}],
+            'images': [{'format': image_format, 'name': 'demo'}],
             'requestId': str(uuid.uuid4()),
             'version': 'V2',
             'timestamp': int(round(time.time() * 1000))
         }
 
         payload = {'message': json.dumps(request_json).encode('UTF-8')}
-        files = [('file', open(image_path, 'rb'))]
-        headers = {'X-OCR-SECRET': secret_key}
-
-        response = requests.post(api_url, headers=headers, data=payload, files=files)
-
-        if response.status_code == 200:
-            ocr_results = response.json()
-            all_texts = []
-            for image_result in ocr_results['images']:
-                for field in image_result['fields']:
-                    text = field['inferText']
-                    all_texts.append(text)
-
-            # 모든 텍스트를 띄어쓰기로 연결하여 출력
-            full_text = ' '.join(all_texts)
-            return full_text
-        else:
+        files = [('file', (f'receipt.{image_format}', data))]
+
+        with timed("ocr_upload"):
+            response = self.session.post(self.api_url, data=payload, files=files, timeout=self.timeout)
+
+        if response.status_code != 200:
             raise Exception(f"OCR 결과를 받아오지 못했습니다. 상태 코드: {response.status_code}")
+
+        ocr_results = response.json()
+        all_texts = []
+        for image_result in ocr_results['images']:
+            for field in image_result['fields']:
+                all_texts.append(field['inferText'])
+
+        # 모든 텍스트를 띄어쓰기로 연결하여 출력
+        return ' '.join(all_texts)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_ocr_client(secret_key: str, api_url: str) -> ClovaOCRClient:
+    """같은 키/엔드포인트에 대해 프로세스 전체에서 하나의 클라이언트를 재사용합니다."""
+    key = (secret_key, api_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = ClovaOCRClient(
+                    secret_key, api_url,
+                    read_timeout=float(os.getenv('OCR_TIMEOUT', '30')),
+                    max_retries=int(os.getenv('OCR_MAX_RETRIES', '2')),
+                    max_side=int(os.getenv('OCR_MAX_SIDE', '1600')),
+                    jpeg_quality=int(os.getenv('OCR_JPEG_QUALITY', '85')),
+                )
+                _clients[key] = client
+    return client
+
+
+def ocr_with_clova(image, secret_key: str, api_url: str) -> str:
+    """Clova OCR API를 사용하여 이미지(bytes, 파일 객체 또는 경로)에서 텍스트 추출"""
+    try:
+        return get_ocr_client(secret_key, api_url).extract_text(image)
     except Exception as e:
         raise Exception(f"오류 발생: {e}")
 
@@ -1,77 +1,231 @@
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from models import Topic
+from models import Topic, ReceiptNote, TopicBatch
+from llm_cache import get_llm_cache
+from metrics import registry, timed, token_config
+from receipt_extractor import DEFAULT_CATEGORY_ID, category_name_to_id, extract_receipt_fields
+import os
 
+# full: 모든 필드를 LLM 으로 추출 / hybrid: 금액·날짜는 규칙으로, 메모·상세만 LLM / local: 확신이 높으면 LLM 생략
+PARSE_MODE = os.getenv('PARSE_MODE', 'hybrid')
+NOTE_MAX_TOKENS = int(os.getenv('PARSE_NOTE_MAX_TOKENS', '256'))
+NOTE_MAX_OCR_CHARS = int(os.getenv('PARSE_NOTE_MAX_OCR_CHARS', '1500'))
+# 같은 OCR 결과는 같은 파싱 결과가 나오도록 0 을 기본값으로 둡니다 (LLM 응답 캐시 대상)
+PARSE_TEMPERATURE = float(os.getenv('PARSE_TEMPERATURE', '0'))
+# 여러 영수증을 한 번의 LLM 호출로 파싱할 때의 입력 토큰 예산, 최대 묶음 크기, 영수증당 출력 토큰
+PARSE_BATCH_INPUT_TOKENS = int(os.getenv('PARSE_BATCH_INPUT_TOKENS', '6000'))
+PARSE_BATCH_MAX_SIZE = int(os.getenv('PARSE_BATCH_MAX_SIZE', '10'))
+PARSE_BATCH_TOKENS_PER_RECEIPT = int(os.getenv('PARSE_BATCH_TOKENS_PER_RECEIPT', '250'))
+PARSE_BATCH_MAX_OUTPUT_TOKENS = int(os.getenv('PARSE_BATCH_MAX_OUTPUT_TOKENS', '4096'))
 
-def parse_ocr_data(ocr_data: str, secret_key: str, api_url: str) -> Topic:
-    """OCR 데이터를 JSON 형식으로 파싱"""
-    try:
-        chat_model = ChatOpenAI(
-            api_key=secret_key,
-            temperature=1.0,
-            max_tokens=2048,
-            model_name="gpt-4o-mini"
-        )
 
-        question = ocr_data + "\n\n이 영수증 데이터를 가지고 JSON 파싱을 진행할거야. 아래 기준에 따라 데이터를 추출해줘."
+def _invoke_parser(ocr_data: str, secret_key: str, pydantic_object, max_tokens: int, instruction: str) -> dict:
+    chat_model = ChatOpenAI(
+        api_key=secret_key,
+        temperature=PARSE_TEMPERATURE,
+        max_tokens=max_tokens,
+        model_name="gpt-4o-mini",
+        cache=get_llm_cache("receipt_parse", PARSE_TEMPERATURE),
+    )
+
+    question = ocr_data + "\n\n" + instruction
+
+    parser = JsonOutputParser(pydantic_object=pydantic_object)
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", "당신은 친절한 AI 어시스턴트입니다. 아래의 OCR 데이터를 추론하여 JSON 형식으로 파싱하세요."),
+            ("user", "{format_instructions}\n\n{question}"),
+        ]
+    )
+
+    prompt = prompt.partial(format_instructions=parser.get_format_instructions())
+    chain = prompt | chat_model | parser
+    with timed("parse_llm"):
+        return chain.invoke({"question": question}, config=token_config("receipt_parse"))
+
+
+def _resolve_category(category_name) -> str:
+    """카테고리 이름을 ID로 매핑하고, 찾지 못하면 '기타'로 설정합니다."""
+    category_id = category_name_to_id(category_name)
+    if category_id is None:
+        print(f"Invalid category name: {category_name}")
+        category_id = DEFAULT_CATEGORY_ID  # '기타'는 기본값으로 14로 설정
+    return category_id
+
+
+def _prefer_llm_category(category_name, fallback_id) -> str:
+    """LLM 이 고른 카테고리를 우선하고, 매핑되지 않을 때만 규칙 기반 추정값을 사용합니다."""
+    category_id = category_name_to_id(category_name)
+    if category_id is not None:
+        return category_id
+    return fallback_id or _resolve_category(category_name)
+
 
-        parser = JsonOutputParser(pydantic_object=Topic)
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", "당신은 친절한 AI 어시스턴트입니다. 아래의 OCR 데이터를 추론하여 JSON 형식으로 파싱하세요."),
-                ("user", "{format_instructions}\n\n{question}"),
-            ]
+def _parse_full(ocr_data: str, secret_key: str) -> Topic:
+    """Topic 의 모든 필드를 LLM 으로 추출"""
+    result = _invoke_parser(ocr_data, secret_key, Topic, 2048,
+                            "이 영수증 데이터를 가지고 JSON 파싱을 진행할거야. 아래 기준에 따라 데이터를 추출해줘.")
+
+    return _to_topic(result)
+
+
+def _to_topic(result) -> Topic:
+    # dict로 변환 후 Topic 모델로 변환
+    if isinstance(result, dict):
+        result = Topic(**result)
+
+    result.category_Id = _resolve_category(result.category_Id)
+    return result
+
+
+def _parse_hybrid(ocr_data: str, secret_key: str, skip_llm_when_confident: bool) -> Topic:
+    """금액/날짜/가맹점은 규칙으로 추출하고, LLM 에는 카테고리와 메모/상세만 요청"""
+    extracted = extract_receipt_fields(ocr_data)
+    print("Extracted receipt fields:", extracted)
+
+    # 금액이나 날짜를 찾지 못하면 전체 파싱으로 대체
+    if not extracted.amount or not extracted.reg_date:
+        return _parse_full(ocr_data, secret_key)
+
+    if skip_llm_when_confident and extracted.confident:
+        return Topic(
+            amount=extracted.amount,
+            reg_date=extracted.reg_date,
+            category_Id=extracted.category_Id,
+            record_memo=extracted.merchant,
+            record_details=f"{extracted.merchant}에서 {int(extracted.amount):,}원 결제",
         )
 
-        prompt = prompt.partial(format_instructions=parser.get_format_instructions())
-        chain = prompt | chat_model | parser
-        result = chain.invoke({"question": question})
-
-        # dict로 변환 후 Topic 모델로 변환
-        if isinstance(result, dict):
-            result = Topic(**result)
-
-        # 카테고리 ID와 이름 매핑
-        category_mapping = {
-            "1": ['소득'],
-            "2": ['저축 출금'],
-            "3": ['차입'],
-            "4": ['세금 · 공과금'],
-            "5": ['식품', '식료품', '식비'],
-            "6": ['주거'],
-            "7": ['피복'],
-            "8": ['보건위생'],
-            "9": ['교육'],
-            "10": ['여가 활동'],
-            "11": ['교통'],
-            "12": ['통신'],
-            "13": ['효도'],
-            "14": ['기타'],
-            "15": ['특비'],
-            "16": ['저축'],
-            "17": ['차입금 상환']
-        }
-
-        # 카테고리 ID 검증 및 기본값 설정
-        category_name = result.category_Id
-        print(category_name)
-        print(category_mapping.values())
-
-        # 카테고리 이름을 ID로 매핑
-        category_id = None
-        for cat_id, names in category_mapping.items():
-            if category_name in names:
-                category_id = cat_id
-                break
-
-        if category_id is None:
-            print(f"Invalid category name: {result.category_Id}")
-            category_id = "14"  # '기타'는 기본값으로 14로 설정
-
-        result.category_Id = category_id
+    note = _invoke_parser(ocr_data[:NOTE_MAX_OCR_CHARS], secret_key, ReceiptNote, NOTE_MAX_TOKENS,
+                          "이 영수증의 카테고리, 메모 제목, 상세 내용만 JSON 으로 짧게 적어줘.")
+    if isinstance(note, dict):
+        note = ReceiptNote(**note)
+
+    return _merge_extracted(extracted, note)
+
+
+def _merge_extracted(extracted, note) -> Topic:
+    """규칙으로 찾은 금액·날짜에 LLM 이 적은 카테고리·메모·상세(ReceiptNote 또는 Topic)를 합칩니다."""
+    return Topic(
+        amount=extracted.amount,
+        reg_date=extracted.reg_date,
+        category_Id=_prefer_llm_category(note.category_Id, extracted.category_Id),
+        record_memo=note.record_memo,
+        record_details=note.record_details,
+    )
+
+
+def parse_ocr_data(ocr_data: str, secret_key: str, api_url: str, mode: str = None) -> Topic:
+    """OCR 데이터를 JSON 형식으로 파싱"""
+    try:
+        mode = mode or PARSE_MODE
+        if mode == 'full':
+            result = _parse_full(ocr_data, secret_key)
+        else:
+            result = _parse_hybrid(ocr_data, secret_key, skip_llm_when_confident=(mode == 'local'))
 
         print(result)
         return result
     except Exception as e:
         raise Exception(f"오류 발생: {e}")
+
+
+def estimate_tokens(text: str) -> int:
+    """토크나이저 없이 보수적으로 추정한 토큰 수 (한글은 대략 한 글자에 한 토큰)"""
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return (len(text) - ascii_chars) + ascii_chars // 3 + 1
+
+
+def plan_batches(ocr_texts, input_budget: int = PARSE_BATCH_INPUT_TOKENS, max_size: int = None):
+    """OCR 텍스트를 순서대로 토큰 예산 안에 들어가도록 묶어, 묶음별 위치 목록을 반환합니다.
+
+    출력 토큰 한도에 맞춰 묶음 크기도 제한하며, 혼자서 예산을 넘는 영수증은 단독 묶음이 됩니다.
+    """
+    max_size = max_size or min(PARSE_BATCH_MAX_SIZE, max(1, PARSE_BATCH_MAX_OUTPUT_TOKENS // PARSE_BATCH_TOKENS_PER_RECEIPT))
+    batches, current, used = [], [], 0
+    for position, ocr_data in enumerate(ocr_texts):
+        tokens = estimate_tokens(ocr_data)
+        if current and (used + tokens > input_budget or len(current) >= max_size):
+            batches.append(current)
+            current, used = [], 0
+        current.append(position)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_batch_once(ocr_texts, secret_key: str) -> dict:
+    """한 묶음을 한 번의 LLM 호출로 파싱하고, 검증을 통과한 결과만 {위치: Topic} 으로 반환합니다.
+
+    카테고리는 LLM 이 적은 이름 그대로 두며, 규칙 추출 결과와 합칠 때 ID 로 바꿉니다.
+    """
+    packed = "\n\n".join(f"[영수증 {number}]\n{ocr_data}" for number, ocr_data in enumerate(ocr_texts, 1))
+    max_tokens = min(PARSE_BATCH_MAX_OUTPUT_TOKENS, PARSE_BATCH_TOKENS_PER_RECEIPT * len(ocr_texts) + 256)
+    response = _invoke_parser(packed, secret_key, TopicBatch, max_tokens,
+                              f"위 {len(ocr_texts)}개의 영수증을 각각 JSON 파싱해서 receipts 목록으로 돌려줘. "
+                              "영수증마다 하나씩, receipt_index 에 영수증 번호를 적고 아래 기준에 따라 데이터를 추출해줘.")
+
+    items = response.get("receipts", []) if isinstance(response, dict) else response
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            position = int(item.pop("receipt_index")) - 1
+            if 0 <= position < len(ocr_texts) and position not in parsed:
+                parsed[position] = Topic(**item)
+        except Exception as e:
+            print(f"묶음 파싱 결과 검증 실패: {e}")
+    return parsed
+
+
+def _count_batch_result(result: str):
+    registry.inc("parse_batch_receipts_total", 1, {"result": result},
+                 "묶음 파싱에서 한 번에 처리된(batched) / 하나씩 다시 파싱된(single) 영수증 수")
+
+
+def parse_ocr_batch(ocr_texts, secret_key: str, api_url: str, mode: str = None) -> list:
+    """여러 OCR 데이터를 토큰 예산에 맞춘 묶음 단위로 한 번에 파싱합니다.
+
+    입력과 같은 순서의 목록을 반환하며, 각 원소는 Topic 또는 그 영수증의 Exception 입니다.
+    묶음 결과에서 빠졌거나 검증에 실패한 영수증만 parse_ocr_data 로 하나씩 다시 파싱합니다.
+    """
+    mode = mode or PARSE_MODE
+    results = [None] * len(ocr_texts)
+    extracted = [extract_receipt_fields(ocr_data) if mode != 'full' else None for ocr_data in ocr_texts]
+
+    # local 모드에서 규칙만으로 확신할 수 있는 영수증은 LLM 호출 없이 처리
+    pending = []
+    for position, fields in enumerate(extracted):
+        if mode == 'local' and fields.amount and fields.reg_date and fields.confident:
+            results[position] = _parse_hybrid(ocr_texts[position], secret_key, skip_llm_when_confident=True)
+        else:
+            pending.append(position)
+
+    for batch in plan_batches([ocr_texts[position] for position in pending]):
+        positions = [pending[index] for index in batch]
+        parsed = {}
+        if len(positions) > 1:
+            try:
+                parsed = _parse_batch_once([ocr_texts[position] for position in positions], secret_key)
+            except Exception as e:
+                print(f"묶음 파싱 중 오류 발생, 하나씩 다시 시도합니다: {e}")
+
+        for index, position in enumerate(positions):
+            topic = parsed.get(index)
+            if topic is None:
+                _count_batch_result("single")
+                try:
+                    results[position] = parse_ocr_data(ocr_texts[position], secret_key, api_url, mode)
+                except Exception as e:
+                    results[position] = e
+                continue
+            _count_batch_result("batched")
+            # hybrid/local 모드에서는 하나씩 파싱할 때(_parse_hybrid)와 같이 규칙으로 찾은 금액·날짜를 쓰고,
+            # 카테고리는 LLM 값을 우선해 규칙 추정값으로 보완합니다. 금액이나 날짜를 못 찾았으면 LLM 결과를 그대로 씁니다
+            fields = extracted[position]
+            if fields is not None and fields.amount and fields.reg_date:
+                results[position] = _merge_extracted(fields, topic)
+            else:
+                results[position] = _to_topic(topic)
+    return results
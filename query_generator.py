@@ -1,16 +1,22 @@
 from langchain.prompts import ChatPromptTemplate
-from langchain.chat_models import ChatOpenAI
+from langchain_openai import ChatOpenAI
 from langchain.schema.output_parser import StrOutputParser
 from langchain.schema.runnable import RunnablePassthrough
-from langchain.utilities import SQLDatabase
 import os
-from db import get_database_engine
+import threading
+import time
+from db import get_connection
+from schema_cache import get_cached_schema
+from result_summary import summarize_result
+from sql_guard import guard_query
+from llm_cache import get_llm_cache
+from metrics import observe_stage, timed, token_config
 from sqlalchemy import text
-from sqlalchemy.engine import Engine  # 여기에 Engine을 import
 
-def generate_sql_query(user_question: str) -> str:
-    """사용자 질문에 기반한 SQL 쿼리 생성"""
-    template = """Based on the table schema below, write a SQL query that would answer the user's question if the categoryType in the Category table is 1, then it is income and 2, then it is expenditure. You should also think about this when finding the total spend and use join.
+# 같은 질문·스키마에는 같은 SQL 이 나오도록 0 을 기본값으로 둡니다 (LLM 응답 캐시 대상)
+SQL_GENERATION_TEMPERATURE = float(os.getenv('SQL_GENERATION_TEMPERATURE', '0'))
+
+SQL_TEMPLATE = """Based on the table schema below, write a SQL query that would answer the user's question if the categoryType in the Category table is 1, then it is income and 2, then it is expenditure. You should also think about this when finding the total spend and use join.
     If we wanted to get the current assets, we'd need to subtract total expenses from total revenue, right? We'd need to join the category table, and records's delYn is deleted or not. If delYn = Trun, it is deleted data and should not be aggregated.
 
     
@@ -19,54 +25,94 @@ def generate_sql_query(user_question: str) -> str:
     Question: {question}
     SQL Query:"""
 
-    engine = get_database_engine()
-    db = SQLDatabase(engine)
-
-    prompt = ChatPromptTemplate.from_template(template)
-
-    def get_schema(_):
-        return db.get_table_info()
+NL_TEMPLATE = """
+    너는 친절하고 귀여운 가상 금융 전문가 챗봇 키키야. 
+    아래 SQL 쿼리 결과가 주어지면 이를 해석해서 지출이면 -, 수익이면 + 를 붙여서 금액을 한문장으로 반말로 알려줘
+    또한 금융전문가로서 개선방안도 한 문장으로 말해줘 :
+    SQL Query: {query}
+    SQL Result: {result}
+    Natural Language Response:"""
 
-    model = ChatOpenAI(openai_api_key=os.getenv('OPENAI_API_KEY'))
+_sql_chain = None
+_nl_chain = None
+_chain_lock = threading.Lock()
+
+
+def get_sql_chain():
+    """SQL 생성 체인(클라이언트 포함)을 처음 쓸 때 만들어 공유합니다."""
+    global _sql_chain
+    if _sql_chain is None:
+        with _chain_lock:
+            if _sql_chain is None:
+                model = ChatOpenAI(
+                    openai_api_key=os.getenv('OPENAI_API_KEY'),
+                    temperature=SQL_GENERATION_TEMPERATURE,
+                    cache=get_llm_cache("sql_generation", SQL_GENERATION_TEMPERATURE),
+                )
+                _sql_chain = (
+                    RunnablePassthrough.assign(schema=lambda _: get_cached_schema())
+                    | ChatPromptTemplate.from_template(SQL_TEMPLATE)
+                    | model.bind(stop=["\nSQLResult:"])
+                    | StrOutputParser()
+                )
+    return _sql_chain
+
+
+def get_nl_chain():
+    """SQL 결과를 자연어로 바꾸는 스트리밍 체인을 처음 쓸 때 만들어 공유합니다."""
+    global _nl_chain
+    if _nl_chain is None:
+        with _chain_lock:
+            if _nl_chain is None:
+                model = ChatOpenAI(
+                    openai_api_key=os.getenv('OPENAI_API_KEY'),
+                    streaming=True,
+                    stream_usage=True,
+                )
+                _nl_chain = ChatPromptTemplate.from_template(NL_TEMPLATE) | model | StrOutputParser()
+    return _nl_chain
 
-    sql_response_chain = (
-        RunnablePassthrough.assign(schema=get_schema)
-        | prompt
-        | model.bind(stop=["\nSQLResult:"])
-        | StrOutputParser()
-    )
 
-    intermediate_result = sql_response_chain.invoke({"question": user_question})
+def generate_sql_query(user_question: str) -> str:
+    """사용자 질문에 기반한 SQL 쿼리 생성"""
+    with timed("sql_generation_llm"):
+        intermediate_result = get_sql_chain().invoke({"question": user_question}, config=token_config("sql_generation"))
     generated_query = intermediate_result.strip()
 
     return generated_query
 
-def execute_and_convert_to_natural_language(engine: Engine, sql_query: str) -> str:
-    """SQL 쿼리를 실행하고 결과를 자연어로 변환"""
-    with engine.connect() as connection:
-        result = connection.execute(text(sql_query)).fetchall()
-        result_str = str(result)
-
-    template = """
-    너는 친절하고 귀여운 가상 금융 전문가 챗봇 키키야. 
-    아래 SQL 쿼리 결과가 주어지면 이를 해석해서 지출이면 -, 수익이면 + 를 붙여서 금액을 한문장으로 반말로 알려줘
-    또한 금융전문가로서 개선방안도 한 문장으로 말해줘 :
-    SQL Query: {query}
-    SQL Result: {result}
-    Natural Language Response:"""
+def run_sql_query(sql_query: str, params: dict = None, guard: bool = True) -> str:
+    """SQL 쿼리를 실행하고 프롬프트에 넣을 결과 요약을 반환 (params 가 있으면 바인딩하여 실행)
 
-    model = ChatOpenAI(openai_api_key=os.getenv('OPENAI_API_KEY'))
+    guard 가 True 면 실행 전에 sql_guard 로 검사합니다 (LLM 이 만든 쿼리). 미리 검증된 템플릿 쿼리는 False 로 호출합니다.
+    """
+    # mysqlconnector 드라이버는 서버 사이드 커서 없이 결과 전체를 클라이언트로 받아오므로(buffered),
+    # 메모리는 sql_guard 가 붙이는 LIMIT 으로 제한되고, 여기서는 행/바이트 한도 안에서 요약한 결과만 프롬프트에 넣습니다
+    with get_connection() as connection:
+        executed_query = guard_query(connection, sql_query, params).sql if guard else sql_query
+        with timed("sql_execution"):
+            result = connection.execute(text(executed_query), params or {})
+            try:
+                return summarize_result(result, sql=executed_query).to_prompt()
+            finally:
+                result.close()
 
-    prompt = ChatPromptTemplate.from_template(template)
 
-    response_chain = (
-        RunnablePassthrough.assign(query=lambda _: sql_query, result=lambda _: result_str)
-        | prompt
-        | model
-    )
+def stream_natural_language(sql_query: str, result_str: str, params: dict = None):
+    """SQL 결과를 자연어로 바꾸며, LLM 토큰이 도착하는 대로 내보냅니다."""
+    if params:
+        sql_query = f"{sql_query}\n-- params: {params}"
 
     input_data = {"query": sql_query, "result": result_str}
     print(input_data)
-    natural_language_response = response_chain.invoke(input_data).content.strip()
-
-    return natural_language_response
\ No newline at end of file
+    started = time.perf_counter()
+    first_token = True
+    for chunk in get_nl_chain().stream(input_data, config=token_config("nl_response")):
+        if not chunk:
+            continue
+        if first_token:
+            observe_stage("nl_ttft", time.perf_counter() - started)
+            first_token = False
+            chunk = chunk.lstrip()
+        yield chunk
+    observe_stage("nl_llm", time.perf_counter() - started)
@@ -0,0 +1,160 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import os
+import threading
+import time
+
+from models import Topic
+
+
+def image_digest(data: bytes) -> str:
+    """이미지 바이트의 SHA-256 해시"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(data: bytes):
+    """다시 인코딩된 같은 사진도 찾을 수 있도록 64비트 dHash 를 계산합니다. 디코딩 실패 시 None."""
+    import cv2
+    import numpy as np
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return None
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _normalize_ocr_text(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+@dataclass
+class ReceiptCacheEntry:
+    ocr_text: str
+    topic: dict
+    created_at: float
+    phash: int = None
+
+
+class ReceiptCache:
+    """이미지 해시를 키로 OCR 텍스트와 파싱 결과(Topic)를 저장하는 LRU + TTL 캐시"""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 86400,
+                 use_perceptual_hash: bool = False, phash_max_distance: int = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.use_perceptual_hash = use_perceptual_hash
+        self.phash_max_distance = phash_max_distance
+        self._entries = OrderedDict()
+        self._phash_index = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.phash_hits = 0
+        self.phash_rejections = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def make_keys(self, data: bytes):
+        """(sha256, dHash) 키 쌍을 만듭니다."""
+        phash = perceptual_hash(data) if self.use_perceptual_hash else None
+        return image_digest(data), phash
+
+    def _expired(self, entry: ReceiptCacheEntry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        if entry.phash is not None and self._phash_index.get(entry.phash) == key:
+            del self._phash_index[entry.phash]
+
+    def _find_by_phash(self, phash):
+        if phash is None:
+            return None
+        key = self._phash_index.get(phash)
+        if key is not None or not self.phash_max_distance:
+            return key
+        for other_phash, other_key in self._phash_index.items():
+            if bin(other_phash ^ phash).count('1') <= self.phash_max_distance:
+                return other_key
+        return None
+
+    def get(self, digest: str):
+        """파일 바이트의 SHA-256 이 같은 항목의 (ocr_text, Topic) 을 반환합니다. 없거나 만료되었으면 None."""
+        with self._lock:
+            entry = self._live_entry(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.ocr_text, Topic(**entry.topic)
+
+    def get_confirmed(self, phash, ocr_text: str):
+        """dHash 가 같은(또는 가까운) 항목 중 OCR 텍스트까지 같은 항목의 Topic 을 반환합니다.
+
+        레이아웃이 비슷한 다른 영수증(같은 가게, 같은 양식)도 dHash 가 같을 수 있으므로,
+        OCR 을 돌린 뒤 텍스트가 일치할 때만 재사용합니다 (LLM 파싱만 생략).
+        """
+        if phash is None:
+            return None
+        with self._lock:
+            key = self._find_by_phash(phash)
+            entry = self._live_entry(key) if key is not None else None
+            if entry is None:
+                return None
+            if _normalize_ocr_text(entry.ocr_text) != _normalize_ocr_text(ocr_text):
+                self.phash_rejections += 1
+                return None
+            self.phash_hits += 1
+            return Topic(**entry.topic)
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, digest: str, ocr_text: str, topic: Topic, phash=None):
+        """OCR 텍스트와 파싱 결과를 저장하고, 가득 차면 가장 오래 쓰이지 않은 항목을 제거합니다."""
+        with self._lock:
+            if digest in self._entries:
+                self._remove(digest)
+            self._entries[digest] = ReceiptCacheEntry(ocr_text, topic.dict(), time.monotonic(), phash)
+            if phash is not None:
+                self._phash_index[phash] = digest
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._phash_index.clear()
+
+    def get_stats(self) -> dict:
+        """캐시 적중/미스 통계를 반환합니다."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "phash_hits": self.phash_hits,
+                "phash_rejections": self.phash_rejections,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.phash_hits) / lookups if lookups else 0.0,
+            }
+
+
+receipt_cache = ReceiptCache(
+    max_entries=int(os.getenv('RECEIPT_CACHE_SIZE', '1000')),
+    ttl_seconds=int(os.getenv('RECEIPT_CACHE_TTL', '86400')),
+    use_perceptual_hash=os.getenv('RECEIPT_CACHE_PHASH', 'false').lower() in ('1', 'true', 'yes'),
+    phash_max_distance=int(os.getenv('RECEIPT_CACHE_PHASH_DISTANCE', '0')),
+)
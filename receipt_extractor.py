@@ -0,0 +1,160 @@
+from dataclasses import dataclass
+from datetime import date
+import re
+
+DEFAULT_CATEGORY_ID = "14"  # 기타
+
+# 카테고리 ID와 이름(동의어 포함) 매핑
+CATEGORY_NAMES = {
+    "1": ['소득', '수입', '급여', '월급'],
+    "2": ['저축 출금'],
+    "3": ['차입', '대출'],
+    "4": ['세금 · 공과금', '세금', '공과금', '관리비'],
+    "5": ['식품', '식료품', '식비', '외식', '음식'],
+    "6": ['주거', '월세', '임대료'],
+    "7": ['피복', '의류', '의복'],
+    "8": ['보건위생', '의료', '병원', '약국'],
+    "9": ['교육', '학원'],
+    "10": ['여가 활동', '여가', '문화', '취미'],
+    "11": ['교통', '교통비', '주유'],
+    "12": ['통신', '통신비'],
+    "13": ['효도'],
+    "14": ['기타'],
+    "15": ['특비'],
+    "16": ['저축'],
+    "17": ['차입금 상환', '대출 상환'],
+}
+
+# 영수증 본문에 나오는 가맹점/품목 키워드로 카테고리 추정
+CATEGORY_KEYWORDS = {
+    "5": ['식당', '카페', '커피', '스타벅스', '이디야', '투썸', '베이커리', '파리바게뜨', '뚜레쥬르', '마트', '이마트',
+          '홈플러스', '롯데마트', '편의점', 'GS25', 'CU', '세븐일레븐', '이마트24', '치킨', '피자', '버거', '분식', '배달의민족'],
+    "7": ['유니클로', '자라', '무신사', '의류'],
+    "8": ['약국', '병원', '의원', '치과', '한의원'],
+    "9": ['서점', '교보문고', '영풍문고', '학원'],
+    "10": ['CGV', '메가박스', '롯데시네마', '영화', 'PC방', '노래방'],
+    "11": ['주유소', '택시', '카카오T', '주차', '고속버스', '코레일', 'SRT'],
+    "12": ['KT', 'SKT', 'LG U+', '통신'],
+}
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[\s·ㆍ・.]", "", name).lower()
+
+
+# 이름 → ID 역색인 (공백/가운뎃점 무시)
+CATEGORY_INDEX = {_normalize(name): cat_id for cat_id, names in CATEGORY_NAMES.items() for name in names}
+
+
+_WORD_CHARS = "가-힣A-Za-z0-9"
+
+
+def _keyword_pattern(keyword: str, prefix_only: bool = False) -> str:
+    # 키워드 앞뒤가 한글/영숫자이면 다른 단어의 일부로 보고 매칭하지 않습니다 ('삼성스토어'의 '마트', '카페인'의 '카페', 'SKT'의 'KT')
+    # prefix_only 이면 뒤에 지점명이 붙는 경우('이마트성수점', 'GS25역삼점')를 위해 앞 경계만 확인합니다
+    pattern = rf"(?<![{_WORD_CHARS}]){re.escape(keyword)}"
+    if prefix_only:
+        return pattern + (r"(?![A-Za-z])" if keyword.isascii() else "")
+    return pattern + rf"(?![{_WORD_CHARS}])"
+
+
+def _compile_keyword_pattern(prefix_only: bool):
+    return re.compile("|".join(
+        _keyword_pattern(keyword, prefix_only) for keyword in sorted(_CATEGORY_KEYWORD_INDEX, key=len, reverse=True)
+    ), re.IGNORECASE)
+
+
+_CATEGORY_KEYWORD_INDEX = {keyword.lower(): cat_id for cat_id, keywords in CATEGORY_KEYWORDS.items() for keyword in keywords}
+_CATEGORY_KEYWORD_PATTERN = _compile_keyword_pattern(prefix_only=False)
+_MERCHANT_KEYWORD_PATTERN = _compile_keyword_pattern(prefix_only=True)
+
+_AMOUNT_KEYWORDS = r"(?:결제\s*금액|받을\s*금액|승인\s*금액|판매\s*총액|총\s*결제\s*금액|총\s*금액|총액|합\s*계|합계\s*금액)"
+_AMOUNT_PATTERN = re.compile(_AMOUNT_KEYWORDS + r"\s*[:：]?\s*(?:₩|\\)?\s*(\d{1,3}(?:,\d{3})+|\d+)\s*원?")
+_WON_PATTERN = re.compile(r"(\d{1,3}(?:,\d{3})+|\d+)\s*원")
+_DATE_PATTERN = re.compile(
+    r"(?<!\d)(?P<year>20\d{2}|\d{2})\s*[-./년]\s*(?P<month>\d{1,2})\s*[-./월]\s*(?P<day>\d{1,2})\s*일?"
+    r"(?:\s*\(?[월화수목금토일]?\)?\s*(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?)?"
+)
+# 가맹점 이름 뒤의 단어는 다른 항목 이름이나 숫자(날짜/전화번호 등)로 시작하지 않을 때만 이름에 포함합니다
+_MERCHANT_PATTERN = re.compile(r"(?:상\s*호\s*명?|가맹점\s*명?|매장\s*명)\s*[:：]?\s*([^\s:：]+(?:\s(?!사업자|대표|주소|전화|TEL|\d)[^\s:：]+)?)")
+
+
+@dataclass
+class ExtractedReceipt:
+    """규칙 기반으로 추출한 영수증 필드"""
+    amount: str = None
+    reg_date: str = None
+    merchant: str = None
+    category_Id: str = None
+
+    @property
+    def confident(self) -> bool:
+        """LLM 없이 Topic 을 만들 수 있을 만큼 필드가 모두 추출되었는지 여부"""
+        return all((self.amount, self.reg_date, self.merchant, self.category_Id))
+
+
+def category_name_to_id(name: str) -> str:
+    """카테고리 이름(또는 ID, 동의어)을 ID로 변환합니다. 찾지 못하면 None."""
+    if name is None:
+        return None
+    name = str(name).strip()
+    if name in CATEGORY_NAMES:
+        return name
+    return CATEGORY_INDEX.get(_normalize(name))
+
+
+def extract_amount(text: str):
+    """합계/결제금액 등 키워드 뒤의 금액을 찾고, 없으면 '원'이 붙은 가장 큰 금액을 사용합니다."""
+    matches = _AMOUNT_PATTERN.findall(text)
+    if not matches:
+        matches = _WON_PATTERN.findall(text)
+    amounts = [int(value.replace(',', '')) for value in matches]
+    amounts = [amount for amount in amounts if amount > 0]
+    return str(max(amounts)) if amounts else None
+
+
+def parse_amount(amount) -> float:
+    """'12,000원', '₩12000' 같은 금액 값을 숫자로 바꿉니다. 읽을 수 없으면 0 을 반환합니다."""
+    try:
+        return float(re.sub(r"[,\s원₩\\]", "", str(amount)))
+    except ValueError:
+        return 0.0
+
+
+def extract_date(text: str):
+    """yyyy-mm-dd (., /, 년월일 구분자 포함) 형식의 날짜와 시간을 찾습니다."""
+    for match in _DATE_PATTERN.finditer(text):
+        year = int(match.group('year'))
+        year = 2000 + year if year < 100 else year
+        try:
+            # 2023-02-30 처럼 달력에 없는 날짜는 건너뜁니다
+            reg_date = date(year, int(match.group('month')), int(match.group('day'))).isoformat()
+        except ValueError:
+            continue
+        if match.group('hour') is not None and int(match.group('hour')) < 24 and int(match.group('minute')) < 60:
+            reg_date += f" {int(match.group('hour')):02d}:{match.group('minute')}:{match.group('second') or '00'}"
+        return reg_date
+    return None
+
+
+def extract_merchant(text: str):
+    """'상호', '가맹점명' 뒤의 가맹점 이름을 찾습니다."""
+    match = _MERCHANT_PATTERN.search(text)
+    return match.group(1).strip() if match else None
+
+
+def guess_category(text: str, merchant: str = None):
+    """가맹점 이름을 우선으로, 없으면 영수증 본문의 독립된 키워드로 카테고리 ID를 추정합니다."""
+    match = (merchant and _MERCHANT_KEYWORD_PATTERN.search(merchant)) or _CATEGORY_KEYWORD_PATTERN.search(text)
+    return _CATEGORY_KEYWORD_INDEX.get(match.group().lower()) if match else None
+
+
+def extract_receipt_fields(text: str) -> ExtractedReceipt:
+    """OCR 텍스트에서 금액, 날짜, 가맹점, 카테고리를 규칙 기반으로 추출합니다."""
+    merchant = extract_merchant(text)
+    return ExtractedReceipt(
+        amount=extract_amount(text),
+        reg_date=extract_date(text),
+        merchant=merchant,
+        category_Id=guess_category(text, merchant),
+    )
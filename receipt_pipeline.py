@@ -0,0 +1,151 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+import os
+import threading
+
+from ocr import ocr_with_clova
+from parse import parse_ocr_batch, parse_ocr_data, plan_batches
+from receipt_cache import receipt_cache
+from models import Topic
+from metrics import in_request_context
+
+# 여러 요청이 동시에 들어와도 외부 API 호출 수를 제한하기 위한 단계별 동시 실행 한도
+OCR_CONCURRENCY = int(os.getenv('OCR_CONCURRENCY', '4'))
+PARSE_CONCURRENCY = int(os.getenv('PARSE_CONCURRENCY', '4'))
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '8'))
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', '200'))
+# 여러 장을 올리면 OCR 결과를 토큰 예산에 맞춰 묶어 한 번의 LLM 호출로 파싱합니다
+PARSE_BATCH_ENABLED = os.getenv('PARSE_BATCH_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+_ocr_slots = threading.BoundedSemaphore(OCR_CONCURRENCY)
+_parse_slots = threading.BoundedSemaphore(PARSE_CONCURRENCY)
+
+
+def _cached_or_ocr(image_bytes: bytes):
+    """캐시에 있으면 (키, None, Topic), 없으면 OCR 을 돌려 (키, OCR 텍스트, None) 을 반환합니다.
+
+    파일 바이트가 같으면 OCR 없이 바로, dHash 만 같으면 OCR 후 텍스트가 같을 때만 캐시 결과를 씁니다.
+    """
+    # 같은 영수증을 다시 올린 경우 OCR/LLM 호출 없이 바로 반환
+    digest, phash = receipt_cache.make_keys(image_bytes)
+    cached = receipt_cache.get(digest)
+    if cached is not None:
+        return (digest, phash), None, cached[1]
+
+    # 디스크에 저장하지 않고 업로드된 바이트를 바로 OCR 로 전달
+    with _ocr_slots:
+        ocr_data = ocr_with_clova(image_bytes, os.getenv('CLOVA_API_KEY'), os.getenv('CLOVA_ENDPOINT'))
+    print("OCR Data Extracted:", ocr_data)
+
+    # 다시 인코딩된 같은 사진이면 OCR 텍스트까지 같을 때만 이전 파싱 결과를 재사용합니다
+    confirmed = receipt_cache.get_confirmed(phash, ocr_data)
+    if confirmed is not None:
+        receipt_cache.put(digest, ocr_data, confirmed, phash)
+        return (digest, phash), None, confirmed
+    return (digest, phash), ocr_data, None
+
+
+def process_receipt(image_bytes: bytes) -> Topic:
+    """영수증 이미지 한 장을 캐시 → OCR → 파싱 순서로 처리합니다."""
+    OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    LangChain_api_url = os.getenv('LANGCHAIN_ENDPOINT')
+
+    (digest, phash), ocr_data, cached = _cached_or_ocr(image_bytes)
+    if cached is not None:
+        return cached
+
+    with _parse_slots:
+        result = parse_ocr_data(ocr_data, OPENAI_API_KEY, LangChain_api_url)
+    print("Parsed OCR Data:", result)
+
+    receipt_cache.put(digest, ocr_data, result, phash)
+    return result
+
+
+def _parse_batch(batch) -> list:
+    """(순번, 파일명, 캐시 키, OCR 텍스트) 묶음을 한 번에 파싱합니다."""
+    with _parse_slots:
+        return parse_ocr_batch([ocr_data for _, _, _, ocr_data in batch],
+                               os.getenv('OPENAI_API_KEY'), os.getenv('LANGCHAIN_ENDPOINT'))
+
+
+def process_receipts(items, max_workers: int = None):
+    """(파일명, 이미지 바이트) 목록을 병렬로 처리하고, 끝나는 순서대로 (순번, 파일명, Topic, 오류) 를 내보냅니다."""
+    if not PARSE_BATCH_ENABLED:
+        yield from _process_receipts_individually(items, max_workers)
+        return
+
+    max_workers = max(1, min(max_workers or BATCH_MAX_WORKERS, len(items)))
+    ocr_task, parse_task = in_request_context(_cached_or_ocr), in_request_context(_parse_batch)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="receipt") as executor:
+        futures = {
+            executor.submit(ocr_task, image_bytes): ("ocr", (index, filename))
+            for index, (filename, image_bytes) in enumerate(items)
+        }
+        ocr_pending = len(futures)
+        ready = []
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, payload = futures.pop(future)
+                    if stage == "ocr":
+                        ocr_pending -= 1
+                        index, filename = payload
+                        try:
+                            keys, ocr_data, cached = future.result()
+                        except Exception as e:
+                            yield index, filename, None, e
+                            continue
+                        if cached is not None:
+                            yield index, filename, cached, None
+                        else:
+                            ready.append((index, filename, keys, ocr_data))
+                        continue
+
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        results = [e] * len(payload)
+                    for (index, filename, (digest, phash), ocr_data), result in zip(payload, results):
+                        if isinstance(result, Exception):
+                            yield index, filename, None, result
+                        else:
+                            receipt_cache.put(digest, ocr_data, result, phash)
+                            yield index, filename, result, None
+
+                # 토큰 예산이 찬 묶음은 바로 파싱을 시작하고, 마지막 묶음은 OCR 이 모두 끝난 뒤 보냅니다
+                batches = plan_batches([ocr_data for _, _, _, ocr_data in ready]) if ready else []
+                if ocr_pending:
+                    batches = batches[:-1]
+                for batch in batches:
+                    payload = [ready[position] for position in batch]
+                    futures[executor.submit(parse_task, payload)] = ("parse", payload)
+                if batches:
+                    submitted = {position for batch in batches for position in batch}
+                    ready = [item for position, item in enumerate(ready) if position not in submitted]
+        finally:
+            # 클라이언트 연결이 끊기면 아직 시작하지 않은 작업은 취소합니다
+            for future in futures:
+                future.cancel()
+
+
+def _process_receipts_individually(items, max_workers: int = None):
+    """영수증마다 OCR → 파싱을 따로 처리합니다 (PARSE_BATCH_ENABLED=false)."""
+    max_workers = max(1, min(max_workers or BATCH_MAX_WORKERS, len(items)))
+    task = in_request_context(process_receipt)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="receipt") as executor:
+        futures = {
+            executor.submit(task, image_bytes): (index, filename)
+            for index, (filename, image_bytes) in enumerate(items)
+        }
+        try:
+            for future in as_completed(futures):
+                index, filename = futures[future]
+                try:
+                    yield index, filename, future.result(), None
+                except Exception as e:
+                    yield index, filename, None, e
+        finally:
+            # 클라이언트 연결이 끊기면 아직 시작하지 않은 작업은 취소합니다
+            for future in futures:
+                future.cancel()
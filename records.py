@@ -0,0 +1,59 @@
+from sqlalchemy import text
+
+from db import session_scope
+from expense_templates import RECORDS_TABLE
+from ledger_analytics import ledger_cache
+from models import Topic
+import rollups
+
+RECORD_ID_COLUMN = "record_Id"
+RECORD_COLUMNS = ("amount", "reg_date", "member_Id", "category_Id", "record_memo", "record_details", "delYn")
+
+INSERT_RECORD_SQL = (
+    f"INSERT INTO {RECORDS_TABLE} ({', '.join(RECORD_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + column for column in RECORD_COLUMNS)})"
+)
+
+
+def insert_records(topics, member_id: int) -> int:
+    """여러 가계부 기록을 member_id 회원의 기록으로 한 번의 multi-row INSERT 로 저장하고 저장된 행 수를 반환합니다.
+
+    Topic.member_Id 기본값(1)으로 저장되지 않도록 회원은 항상 호출하는 쪽에서 받습니다 (캐시된 Topic 은 바꾸지 않음).
+    """
+    rows = [{**{column: getattr(topic, column) for column in RECORD_COLUMNS}, "member_Id": member_id} for topic in topics]
+    if not rows:
+        return 0
+
+    if rollups.ROLLUPS_ENABLED:
+        # CREATE TABLE 은 트랜잭션을 암묵적으로 커밋하므로 세션을 열기 전에 준비합니다
+        rollups.ensure_rollup_table()
+    with session_scope() as session:
+        session.execute(text(INSERT_RECORD_SQL), rows)
+        if rollups.ROLLUPS_ENABLED:
+            rollups.apply_records(session, rows, sign=1)
+        session.commit()
+    ledger_cache.append_records(rows)
+    return len(rows)
+
+
+def soft_delete_record(record_id: int, member_id: int) -> bool:
+    """member_id 회원의 기록을 삭제 표시(delYn = 1)하고 월별 집계에서 뺍니다. 다른 회원의 기록이거나, 이미 삭제되었거나, 없으면 False."""
+    params = {"record_id": record_id, "member_Id": member_id}
+    if rollups.ROLLUPS_ENABLED:
+        rollups.ensure_rollup_table()
+    with session_scope() as session:
+        row = session.execute(text(
+            f"SELECT {', '.join(RECORD_COLUMNS)} FROM {RECORDS_TABLE} "
+            f"WHERE {RECORD_ID_COLUMN} = :record_id AND member_Id = :member_Id FOR UPDATE"
+        ), params).mappings().first()
+        if row is None or int(row["delYn"] or 0):
+            return False
+
+        session.execute(text(
+            f"UPDATE {RECORDS_TABLE} SET delYn = 1 WHERE {RECORD_ID_COLUMN} = :record_id AND member_Id = :member_Id"
+        ), params)
+        if rollups.ROLLUPS_ENABLED:
+            rollups.apply_records(session, [dict(row)], sign=-1)
+        session.commit()
+    ledger_cache.remove_record(row["member_Id"], record_id)
+    return True
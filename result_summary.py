@@ -0,0 +1,129 @@
+from decimal import Decimal
+import os
+import re
+
+SQL_RESULT_MAX_ROWS = int(os.getenv('SQL_RESULT_MAX_ROWS', '5000'))
+SQL_RESULT_MAX_BYTES = int(os.getenv('SQL_RESULT_MAX_BYTES', '4000'))
+SQL_RESULT_TOP_N = int(os.getenv('SQL_RESULT_TOP_N', '10'))
+SQL_RESULT_FETCH_SIZE = int(os.getenv('SQL_RESULT_FETCH_SIZE', '500'))
+# 그룹별 합계를 낼 컬럼의 최대 고유값 수 (넘으면 그룹 합계 생략)
+MAX_GROUPS = 50
+
+
+# 합계를 낼 금액 컬럼 이름 단서 (categoryType, delYn 같은 코드/플래그 컬럼은 합산하지 않습니다)
+_AMOUNT_HINTS = ('amount', 'total', 'sum', 'spent', 'income', 'expense', 'balance', 'asset', '금액', '합계', '자산')
+_NOT_AMOUNT_HINTS = ('count', 'cnt', 'type', 'yn')
+_DATE_HINTS = ('date', 'month', 'day', 'year', 'week', '월', '일')
+_GROUP_BY_PATTERN = re.compile(r"\bgroup\s+by\s+(.+?)(?:\bhaving\b|\border\s+by\b|\blimit\b|\bwith\s+rollup\b|;|\)|$)",
+                               re.IGNORECASE | re.DOTALL)
+_IDENTIFIER_PATTERN = re.compile(r"`?([A-Za-z_][A-Za-z0-9_]*)`?")
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _is_amount_column(name: str) -> bool:
+    lowered = name.lower()
+    if lowered.endswith('id') or any(hint in lowered for hint in _NOT_AMOUNT_HINTS):
+        return False
+    return any(hint in lowered for hint in _AMOUNT_HINTS)
+
+
+def _pick_group_column(columns, sql: str = None):
+    """쿼리의 GROUP BY 에 적힌 컬럼을 우선 사용하고, 없으면 카테고리 → 날짜 컬럼 순으로 고릅니다."""
+    lowered = [name.lower() for name in columns]
+    match = _GROUP_BY_PATTERN.search(sql or "")
+    if match:
+        first = match.group(1).split(',')[0].strip()
+        if first.isdigit() and 0 < int(first) <= len(columns):
+            return int(first) - 1
+        # c.category_name, DATE_FORMAT(r.reg_date, ...) 처럼 별칭/함수가 붙어도 결과 컬럼 이름과 맞춰 봅니다
+        for identifier in _IDENTIFIER_PATTERN.findall(first):
+            if identifier.lower() in lowered:
+                return lowered.index(identifier.lower())
+
+    for hints in (('categor',), _DATE_HINTS):
+        for index, name in enumerate(lowered):
+            if any(hint in name for hint in hints) and not _is_amount_column(name) and 'type' not in name:
+                return index
+    return None
+
+
+class ResultSummary:
+    """SQL 결과를 한 행씩 읽으면서 행 수, 금액 컬럼 합계, 그룹별 합계, 처음 N행만 보관합니다."""
+
+    def __init__(self, columns, top_n: int = SQL_RESULT_TOP_N, sql: str = None):
+        self.columns = list(columns)
+        self.top_n = top_n
+        self.row_count = 0
+        self.truncated = False
+        self.rows = []
+        self.totals = {}
+        self.amount_columns = [index for index, name in enumerate(self.columns) if _is_amount_column(name)]
+        self.group_column = _pick_group_column(self.columns, sql)
+        self.groups = {}
+        self.group_overflow = False
+
+    def add(self, row):
+        self.row_count += 1
+        if len(self.rows) < self.top_n:
+            self.rows.append(tuple(row))
+
+        amount = None
+        for index in self.amount_columns:
+            value = row[index]
+            if _is_number(value):
+                name = self.columns[index]
+                self.totals[name] = self.totals.get(name, 0) + value
+                if amount is None:
+                    amount = value
+
+        if self.group_column is not None and not self.group_overflow and amount is not None:
+            key = row[self.group_column]
+            if key not in self.groups and len(self.groups) >= MAX_GROUPS:
+                self.group_overflow = True
+                self.groups.clear()
+            else:
+                self.groups[key] = self.groups.get(key, 0) + amount
+
+    def to_prompt(self, max_bytes: int = SQL_RESULT_MAX_BYTES) -> str:
+        """프롬프트에 넣을 결과 문자열. 작은 결과는 그대로, 큰 결과는 요약으로 만듭니다."""
+        if not self.truncated and self.row_count <= self.top_n:
+            full = str(self.rows)
+            if len(full.encode('utf-8')) <= max_bytes:
+                return full
+
+        lines = [
+            f"총 {self.row_count}행" + (" 이상 (행 제한으로 일부만 집계)" if self.truncated else ""),
+            f"컬럼: {', '.join(self.columns)}",
+        ]
+        if self.totals:
+            lines.append("금액 컬럼 합계: " + ", ".join(f"{name}={value}" for name, value in self.totals.items()))
+        if self.groups:
+            top_groups = sorted(self.groups.items(), key=lambda item: abs(item[1]), reverse=True)
+            lines.append(f"{self.columns[self.group_column]}별 합계: "
+                         + ", ".join(f"{key}={value}" for key, value in top_groups[:self.top_n]))
+        lines.append(f"처음 {len(self.rows)}행: {self.rows}")
+
+        text = "\n".join(lines)
+        encoded = text.encode('utf-8')
+        if len(encoded) > max_bytes:
+            text = encoded[:max_bytes].decode('utf-8', errors='ignore') + " ...(생략)"
+        return text
+
+
+def summarize_result(result, max_rows: int = SQL_RESULT_MAX_ROWS, top_n: int = SQL_RESULT_TOP_N,
+                     sql: str = None) -> ResultSummary:
+    """SQLAlchemy 결과를 행 목록으로 복사하지 않고 나눠 읽으며 최대 max_rows 행까지만 요약합니다. sql 은 그룹 컬럼을 고르는 데 씁니다.
+
+    드라이버가 결과를 이미 모두 받아온 경우(mysqlconnector)에는 메모리를 줄이지 못하므로, 결과 크기는 쿼리의 LIMIT 으로 제한합니다.
+    """
+    summary = ResultSummary(result.keys(), top_n=top_n, sql=sql)
+    for partition in result.partitions(SQL_RESULT_FETCH_SIZE):
+        for row in partition:
+            if summary.row_count >= max_rows:
+                summary.truncated = True
+                return summary
+            summary.add(row)
+    return summary
@@ -0,0 +1,143 @@
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from db import get_connection, session_scope
+from expense_templates import RECORDS_TABLE, CATEGORY_TABLE, ROLLUP_TABLE
+from receipt_extractor import parse_amount
+import os
+import threading
+
+# records 에 다른 서비스도 쓰는 경우 집계가 어긋날 수 있으므로 기본은 꺼져 있습니다 (/rebuild-rollups/ 로 재집계)
+ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+CREATE_ROLLUP_TABLE_SQL = f"""CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+    member_Id BIGINT NOT NULL,
+    ym CHAR(7) NOT NULL,
+    category_Id BIGINT NOT NULL,
+    total DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    record_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (member_Id, ym, category_Id)
+)"""
+
+UPSERT_ROLLUP_SQL = f"""INSERT INTO {ROLLUP_TABLE} (member_Id, ym, category_Id, total, record_count)
+VALUES (:member_Id, :ym, :category_Id, :total, :record_count)
+ON DUPLICATE KEY UPDATE total = total + VALUES(total), record_count = record_count + VALUES(record_count)"""
+
+# 재집계도 증분 반영(_deltas)과 같이 parse_amount 로 금액을 읽도록 행을 가져와 파이썬에서 묶습니다
+# ('12,000원' 같은 값을 MySQL SUM 은 12 로 읽습니다)
+REBUILD_SOURCE_SQL = f"""SELECT r.member_Id, r.reg_date, r.category_Id, r.amount
+FROM {RECORDS_TABLE} r
+WHERE r.delYn = 0 {{member_filter}}"""
+REBUILD_FETCH_SIZE = 1000
+
+PERIOD_TOTALS_SQL = f"""SELECT c.categoryType, COALESCE(SUM(m.total), 0) AS total, COALESCE(SUM(m.record_count), 0) AS record_count
+FROM {ROLLUP_TABLE} m
+JOIN {CATEGORY_TABLE} c ON m.category_Id = c.category_Id
+WHERE m.member_Id = :member_Id
+  AND m.ym >= :start_month
+  AND m.ym < :end_month
+GROUP BY c.categoryType"""
+
+MONTHLY_TOTALS_SQL = f"""SELECT m.ym, m.category_Id, c.categoryType, m.total, m.record_count
+FROM {ROLLUP_TABLE} m
+JOIN {CATEGORY_TABLE} c ON m.category_Id = c.category_Id
+WHERE m.member_Id = :member_Id
+  AND m.ym >= :start_month
+  AND m.ym < :end_month
+ORDER BY m.ym, m.category_Id"""
+
+
+def to_year_month(reg_date) -> str:
+    """reg_date (문자열 또는 date/datetime) 를 'YYYY-MM' 로 변환합니다."""
+    if isinstance(reg_date, (date, datetime)):
+        return reg_date.strftime('%Y-%m')
+    return str(reg_date).strip()[:7].replace('.', '-').replace('/', '-')
+
+
+# 이 프로세스에서 월별 집계 테이블이 있는 것을 확인했는지 여부 (워밍업을 하지 않으면 처음 쓸 때 확인)
+_rollup_table_ready = False
+_rollup_table_lock = threading.Lock()
+
+
+def ensure_rollup_table() -> bool:
+    """월별 집계 테이블이 없으면 만들고 전체를 집계합니다. 새로 만들었으면 True 를 반환합니다."""
+    global _rollup_table_ready
+    with _rollup_table_lock:
+        if _rollup_table_ready:
+            return False
+        with get_connection() as connection:
+            exists = connection.execute(text(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = :name"
+            ), {"name": ROLLUP_TABLE}).scalar()
+        if not exists:
+            with session_scope() as session:
+                session.execute(text(CREATE_ROLLUP_TABLE_SQL))
+                session.commit()
+            rebuild_rollups()
+        _rollup_table_ready = True
+        return not exists
+
+
+def _deltas(records, sign: int):
+    """기록 목록을 (회원, 월, 카테고리) 단위 증감 행으로 묶습니다."""
+    grouped = defaultdict(lambda: [0, 0])
+    for record in records:
+        key = (int(record["member_Id"]), to_year_month(record["reg_date"]), int(record["category_Id"]))
+        grouped[key][0] += sign * parse_amount(record["amount"])
+        grouped[key][1] += sign
+    return [
+        {"member_Id": member_id, "ym": ym, "category_Id": category_id, "total": total, "record_count": count}
+        for (member_id, ym, category_id), (total, count) in grouped.items()
+    ]
+
+
+def apply_records(session, records, sign: int = 1):
+    """새로 저장된(sign=1) 또는 삭제된(sign=-1) 기록을 같은 트랜잭션 안에서 월별 집계에 반영합니다."""
+    rows = _deltas([record for record in records if not int(record.get("delYn") or 0)], sign)
+    if rows:
+        session.execute(text(UPSERT_ROLLUP_SQL), rows)
+
+
+def rebuild_rollups(member_id: int = None):
+    """records 전체(또는 한 회원)를 다시 집계해 월별 집계 테이블을 새로 채웁니다."""
+    member_filter = "AND r.member_Id = :member_Id" if member_id is not None else ""
+    params = {"member_Id": member_id} if member_id is not None else {}
+    with session_scope() as session:
+        if member_id is None:
+            session.execute(text(f"DELETE FROM {ROLLUP_TABLE}"))
+        else:
+            session.execute(text(f"DELETE FROM {ROLLUP_TABLE} WHERE member_Id = :member_Id"), params)
+        result = session.execute(text(REBUILD_SOURCE_SQL.format(member_filter=member_filter)), params)
+        # 행을 목록으로 모으지 않고 (회원, 월, 카테고리) 합계만 메모리에 둡니다
+        rows = _deltas((row._mapping for partition in result.partitions(REBUILD_FETCH_SIZE) for row in partition), sign=1)
+        if rows:
+            session.execute(text(UPSERT_ROLLUP_SQL), rows)
+        session.commit()
+
+
+def _month_params(member_id: int, start_date, end_date) -> dict:
+    return {"member_Id": member_id, "start_month": to_year_month(start_date), "end_month": to_year_month(end_date)}
+
+
+def get_period_totals(member_id: int, start_date, end_date) -> dict:
+    """[start_date, end_date) 월 범위의 수입/지출 합계를 반환합니다. end_date 가 속한 달은 포함하지 않습니다."""
+    ensure_rollup_table()
+    with get_connection() as connection:
+        rows = connection.execute(text(PERIOD_TOTALS_SQL), _month_params(member_id, start_date, end_date)).fetchall()
+
+    totals = {"income": 0, "expense": 0, "income_count": 0, "expense_count": 0}
+    for category_type, total, record_count in rows:
+        kind = "income" if int(category_type) == 1 else "expense"
+        totals[kind] = total
+        totals[f"{kind}_count"] = int(record_count)
+    totals["balance"] = totals["income"] - totals["expense"]
+    return totals
+
+
+def get_monthly_totals(member_id: int, start_date, end_date) -> list:
+    """[start_date, end_date) 월 범위의 월/카테고리별 합계 행을 반환합니다."""
+    ensure_rollup_table()
+    with get_connection() as connection:
+        return connection.execute(text(MONTHLY_TOTALS_SQL), _month_params(member_id, start_date, end_date)).fetchall()
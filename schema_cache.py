@@ -0,0 +1,129 @@
+from langchain.utilities import SQLDatabase
+from sqlalchemy import bindparam, text
+from db import get_database_engine, get_connection
+from metrics import timed
+import os
+import threading
+import time
+
+# 가계부 질문에 필요한 테이블 (소문자 기준으로 비교)
+DEFAULT_LEDGER_TABLES = ('records', 'category')
+
+# GROUP_CONCAT 은 group_concat_max_len(기본 1024바이트)에서 잘리므로, 잘리지 않는 집계로 컬럼별 해시를 합칩니다
+# (XOR 은 같은 값 두 개가 서로 지워지므로 합계와 컬럼 수도 함께 비교)
+SCHEMA_CHECKSUM_QUERY = """
+    SELECT CONCAT_WS('-', COUNT(*), BIT_XOR(column_crc), SUM(column_crc))
+    FROM (
+        SELECT CRC32(CONCAT_WS(':', table_name, column_name, ordinal_position, column_type, column_key)) AS column_crc
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+          {table_filter}
+    ) columns_crc
+"""
+
+
+class SchemaCache:
+    """DB 스키마 정보를 한 번 만들어 두고 요청 간에 재사용하는 캐시"""
+
+    def __init__(self, ttl_seconds: int = 600, tables=DEFAULT_LEDGER_TABLES, sample_rows: int = 3):
+        self.ttl_seconds = ttl_seconds
+        self.tables = tables
+        self.sample_rows = sample_rows
+        self._lock = threading.Lock()
+        self._schema = None
+        self._checksum = None
+        self._built_at = 0.0
+        self.version = 0
+
+    def _compute_checksum(self):
+        """information_schema 기반으로 현재 스키마의 체크섬을 계산합니다."""
+        try:
+            # 프롬프트에 넣는 테이블만 비교합니다 (설정이 비어 있으면 전체 테이블)
+            if self.tables:
+                query = text(SCHEMA_CHECKSUM_QUERY.format(table_filter="AND LOWER(table_name) IN :tables"))
+                query = query.bindparams(bindparam("tables", expanding=True))
+                params = {"tables": [name.lower() for name in self.tables]}
+            else:
+                query, params = text(SCHEMA_CHECKSUM_QUERY.format(table_filter="")), {}
+            with get_connection() as connection:
+                return connection.execute(query, params).scalar()
+        except Exception as e:
+            print(f"스키마 체크섬 계산 중 오류 발생: {e}")
+            return None
+
+    def _resolve_tables(self, db: SQLDatabase):
+        """설정된 테이블 이름을 실제 테이블 이름으로 매칭합니다 (대소문자 무시)."""
+        if not self.tables:
+            return None
+        wanted = {name.lower() for name in self.tables}
+        matched = [name for name in db.get_usable_table_names() if name.lower() in wanted]
+        return matched or None
+
+    def _build(self) -> str:
+        engine = get_database_engine()
+        db = SQLDatabase(engine, sample_rows_in_table_info=self.sample_rows)
+        return db.get_table_info(table_names=self._resolve_tables(db))
+
+    def refresh(self) -> str:
+        """캐시를 강제로 다시 만듭니다."""
+        with self._lock:
+            return self._rebuild()
+
+    def _rebuild(self) -> str:
+        checksum = self._compute_checksum()
+        self._schema = self._build()
+        self._checksum = checksum
+        self._built_at = time.monotonic()
+        self.version += 1
+        print(f"스키마 캐시 갱신 (version={self.version})")
+        return self._schema
+
+    def invalidate(self):
+        """다음 조회 시 스키마를 다시 만들도록 캐시를 비웁니다."""
+        with self._lock:
+            self._schema = None
+
+    def get(self) -> str:
+        """캐시된 스키마를 반환합니다. TTL이 지나면 체크섬을 확인해 변경 시에만 다시 만듭니다."""
+        schema = self._schema
+        if schema is not None and time.monotonic() - self._built_at < self.ttl_seconds:
+            return schema
+
+        with self._lock:
+            if self._schema is None:
+                return self._rebuild()
+            if time.monotonic() - self._built_at < self.ttl_seconds:
+                return self._schema
+
+            checksum = self._compute_checksum()
+            if checksum is not None and checksum == self._checksum:
+                self._built_at = time.monotonic()
+                return self._schema
+            return self._rebuild()
+
+
+def _get_tables_from_env():
+    tables = os.getenv('SCHEMA_TABLES')
+    if tables is None:
+        return DEFAULT_LEDGER_TABLES
+    # SCHEMA_TABLES= (빈 값) 이면 전체 테이블 사용
+    return tuple(name.strip() for name in tables.split(',') if name.strip())
+
+
+schema_cache = SchemaCache(
+    ttl_seconds=int(os.getenv('SCHEMA_CACHE_TTL', '600')),
+    tables=_get_tables_from_env(),
+    sample_rows=int(os.getenv('SCHEMA_SAMPLE_ROWS', '3')),
+)
+
+
+def get_cached_schema() -> str:
+    """generate_sql_query 에서 사용할 스키마 문자열을 반환합니다."""
+    with timed("schema_fetch"):
+        return schema_cache.get()
+
+
+def refresh_schema() -> int:
+    """스키마 캐시를 즉시 갱신하고 새 버전을 반환합니다."""
+    schema_cache.refresh()
+    return schema_cache.version
@@ -1,23 +1,21 @@
-from db import get_session
+from db import session_scope
+from sql_guard import UnsafeQueryError, guard_query
 from sqlalchemy import text
 
 def execute_sql_query(generated_query: str) -> str:
-    """생성된 SQL 쿼리를 실행하고 결과를 반환"""
+    """생성된 SQL 쿼리를 검사한 뒤 읽기 전용으로 실행하고 결과를 반환"""
     try:
-        session = get_session()
-        # SQLAlchemy text 객체로 쿼리 감싸기
-        result = session.execute(text(generated_query))
-        session.commit()  # 데이터 변경 시 커밋 필요
-
-        # 결과가 있을 경우
-        if result.returns_rows:
+        with session_scope() as session:
+            connection = session.connection()
+            guarded = guard_query(connection, generated_query)
+            # SQLAlchemy text 객체로 쿼리 감싸기 (조회만 허용하므로 커밋하지 않고 세션 종료 시 롤백됩니다)
+            result = session.execute(text(guarded.sql))
             result_data = result.fetchall()
             result_str = "\n".join(str(row) for row in result_data)
-        else:
-            # 결과가 없을 경우 (예: INSERT, UPDATE, DELETE)
-            result_str = "쿼리 실행 완료"
-        session.close()
         return result_str
+    except UnsafeQueryError as e:
+        print(f"쿼리 실행 거부: {e}")
+        return f"쿼리 실행 거부: {e}"
     except Exception as e:
         print(f"쿼리 실행 중 오류 발생: {e}")
         return f"쿼리 실행 중 오류 발생: {e}"
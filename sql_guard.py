@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+import os
+import re
+
+from sqlalchemy import text
+
+from metrics import registry, timed
+from result_summary import SQL_RESULT_MAX_ROWS
+
+SQL_GUARD_ENABLED = os.getenv('SQL_GUARD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# EXPLAIN 으로 추정한 검사 행 수가 이보다 크면 실행하지 않습니다
+SQL_GUARD_MAX_EXAMINED_ROWS = int(os.getenv('SQL_GUARD_MAX_EXAMINED_ROWS', '1000000'))
+# LIMIT 이 없을 때 붙일 값 (요약 단계가 잘림을 알 수 있도록 한 행 더 읽습니다)
+SQL_GUARD_DEFAULT_LIMIT = int(os.getenv('SQL_GUARD_DEFAULT_LIMIT', str(SQL_RESULT_MAX_ROWS + 1)))
+SQL_GUARD_TIMEOUT_MS = int(os.getenv('SQL_GUARD_TIMEOUT_MS', '5000'))
+
+# 문자열/식별자 리터럴과 주석 (키워드 검사 전에 지워서 값 안의 단어에 속지 않도록 합니다)
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`")
+_COMMENT_RE = re.compile(r"--[^\n]*|#[^\n]*|/\*.*?\*/", re.S)
+_WORD_RE = re.compile(r"[A-Za-z_]+|[()]")
+# 최상위(괄호 밖)에 나오면 조회가 아닌 문장/구문 (WITH ... UPDATE, SELECT ... INTO, FOR UPDATE 등)
+_TOP_LEVEL_FORBIDDEN = {"INSERT", "UPDATE", "DELETE", "REPLACE", "INTO", "LOCK", "SET", "CALL", "DO", "HANDLER"}
+# 어디에 나와도 거부하는 함수/구문
+_ANYWHERE_FORBIDDEN = {"OUTFILE", "DUMPFILE", "SLEEP", "BENCHMARK", "GET_LOCK", "LOAD_FILE"}
+
+
+class UnsafeQueryError(ValueError):
+    """읽기 경로에서 실행할 수 없는 SQL (쓰기 문장, 여러 문장, 비용 초과 등)"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+@dataclass
+class GuardedQuery:
+    sql: str
+    rewrites: tuple = ()
+    estimated_rows: int = None
+
+
+def _count(action: str, reason: str):
+    registry.inc("sql_guard_total", 1, {"action": action, "reason": reason},
+                 "생성된 SQL 검사 결과 (rejected/rewritten/passed)")
+
+
+def _reject(reason: str, message: str):
+    _count("rejected", reason)
+    raise UnsafeQueryError(reason, message)
+
+
+def _mask(sql: str) -> str:
+    """리터럴과 주석을 같은 길이의 공백으로 바꿔, 위치를 유지한 채 구조만 남깁니다."""
+    blank = lambda match: " " * len(match.group(0))
+    return _COMMENT_RE.sub(blank, _LITERAL_RE.sub(blank, sql))
+
+
+def _top_level_words(masked: str):
+    """괄호 밖(depth 0)에 있는 단어와 그 위치를 차례로 반환합니다."""
+    depth = 0
+    for match in _WORD_RE.finditer(masked):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0:
+            yield token.upper(), match.start(), match.end()
+
+
+def check_read_only(sql: str) -> str:
+    """한 개의 SELECT(또는 WITH ... SELECT) 문장인지 확인하고 끝의 세미콜론을 뗀 SQL 을 반환합니다."""
+    sql = sql.strip()
+    # LLM 이 ```sql 코드 블록으로 감싸 돌려주는 경우
+    if sql.startswith("```"):
+        sql = re.sub(r"^```\w*\s*|\s*```$", "", sql)
+    sql = sql.rstrip().rstrip(";").rstrip()
+    masked = _mask(sql)
+
+    if ";" in masked:
+        _reject("multiple_statements", "여러 개의 SQL 문장은 실행할 수 없습니다.")
+    top_level = [word for word, _, _ in _top_level_words(masked)]
+    if not top_level or top_level[0] not in ("SELECT", "WITH"):
+        _reject("not_select", "조회(SELECT) 쿼리만 실행할 수 있습니다.")
+    forbidden = _TOP_LEVEL_FORBIDDEN.intersection(top_level)
+    forbidden |= _ANYWHERE_FORBIDDEN.intersection(word.upper() for word in _WORD_RE.findall(masked))
+    if forbidden:
+        _reject("forbidden_keyword", f"허용되지 않는 구문이 포함되어 있습니다: {', '.join(sorted(forbidden))}")
+    return sql
+
+
+def _inject_limit(sql: str, masked: str, limit: int) -> str:
+    if any(word == "LIMIT" for word, _, _ in _top_level_words(masked)):
+        return sql
+    return f"{sql}\nLIMIT {limit}"
+
+
+def _inject_timeout_hint(sql: str, masked: str, timeout_ms: int) -> str:
+    """최상위 SELECT 바로 뒤에 MySQL MAX_EXECUTION_TIME 힌트를 넣습니다."""
+    for word, start, end in _top_level_words(masked):
+        if word == "SELECT":
+            return f"{sql[:end]} /*+ MAX_EXECUTION_TIME({timeout_ms}) */{sql[end:]}"
+    return sql
+
+
+def estimate_examined_rows(connection, sql: str, params: dict = None) -> int:
+    """EXPLAIN 의 rows 를 같은 id(조인 단위)끼리 곱하고, 서로 다른 id 끼리는 더해 검사 행 수를 추정합니다."""
+    result = connection.execute(text(f"EXPLAIN {sql}"), params or {})
+    per_select = {}
+    for row in result.mappings():
+        rows = row.get("rows") or 1
+        select_id = row.get("id")
+        per_select[select_id] = per_select.get(select_id, 1) * max(int(rows), 1)
+    return sum(per_select.values())
+
+
+def guard_query(connection, sql: str, params: dict = None,
+                max_examined_rows: int = SQL_GUARD_MAX_EXAMINED_ROWS,
+                default_limit: int = SQL_GUARD_DEFAULT_LIMIT,
+                timeout_ms: int = SQL_GUARD_TIMEOUT_MS) -> GuardedQuery:
+    """생성된 SQL 을 실행 전에 검사합니다.
+
+    쓰기/여러 문장은 거부하고, EXPLAIN 추정 행 수가 max_examined_rows 를 넘으면 거부하며,
+    LIMIT 이 없으면 붙이고 문장 단위 실행 시간 제한 힌트를 넣은 SQL 을 반환합니다.
+    """
+    if not SQL_GUARD_ENABLED:
+        return GuardedQuery(sql)
+
+    sql = check_read_only(sql)
+
+    with timed("sql_guard_explain"):
+        try:
+            estimated_rows = estimate_examined_rows(connection, sql, params)
+        except Exception as e:
+            _reject("explain_failed", f"쿼리를 분석할 수 없습니다: {e}")
+    if max_examined_rows and estimated_rows > max_examined_rows:
+        _reject("too_expensive", f"예상 검사 행 수({estimated_rows:,})가 한도({max_examined_rows:,})를 넘습니다.")
+
+    rewrites = []
+    if default_limit:
+        limited = _inject_limit(sql, _mask(sql), default_limit)
+        if limited != sql:
+            rewrites.append("limit")
+            sql = limited
+    if timeout_ms:
+        sql = _inject_timeout_hint(sql, _mask(sql), timeout_ms)
+
+    if rewrites:
+        _count("rewritten", "+".join(rewrites))
+    else:
+        _count("passed", "ok")
+    return GuardedQuery(sql, tuple(rewrites), estimated_rows)